@@ -2,6 +2,8 @@
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, Query
 from chromadb_utils import client, extract_chunks_from_pdf, index_chunks, query_text, empty_collection, retrieve_schema, populate_schema_with_content
+import asyncio
+import hashlib
 import os
 import uuid
 
@@ -9,18 +11,42 @@ app = FastAPI()
 
 UPLOAD_DIR = "data"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "100"))
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Same chunked hash-and-write loop as transcription_server/uploads.py
+# (save_upload): each service is its own Docker build context, so the two
+# cannot import each other's modules
+def _hash_and_write(digest, f, chunk: bytes):
+    digest.update(chunk)
+    f.write(chunk)
 
 @app.post("/upload-pdf/")
 async def upload_pdf(file: UploadFile = File(...)):
     file_id = str(uuid.uuid4())
     file_path = os.path.join(UPLOAD_DIR, f"{file_id}.pdf")
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    max_bytes = int(MAX_UPLOAD_MB * 2**20)
+    # Written in chunks from a worker thread: the loop stays free and the PDF
+    # is never held in memory as a whole
+    digest = hashlib.sha256()
+    size = 0
+    f = await asyncio.to_thread(open, file_path, "wb")
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"PDF is larger than {MAX_UPLOAD_MB:.0f} MB")
+            await asyncio.to_thread(_hash_and_write, digest, f, chunk)
+    except BaseException:
+        f.close()
+        os.remove(file_path)
+        raise
+    await asyncio.to_thread(f.close)
 
-    chunks = extract_chunks_from_pdf(file_path)
-    index_chunks(chunks)
-    return {"message": "PDF processed and indexed.", "file_id": file_id}
+    # Parsing and embedding are CPU bound
+    chunks = await asyncio.to_thread(extract_chunks_from_pdf, file_path)
+    await asyncio.to_thread(index_chunks, chunks)
+    return {"message": "PDF processed and indexed.", "file_id": file_id, "sha256": digest.hexdigest(), "size_bytes": size}
 
 @app.post("/empty-collection/")
 async def empty_collection_endpoint():
@@ -0,0 +1,190 @@
+"""
+SQLite registry of uploaded audios, their artifacts and processing jobs.
+
+One row per audio_id holds the upload (original name, path, content hash,
+size, duration), the state of its latest processing job (status, stage,
+percent, error, parameters, timings) and where its outputs live. The
+database runs in WAL mode, so every uvicorn worker process reads and writes
+the same state and lookups are indexed instead of globbing the upload dir.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+AUDIO_REGISTRY_DB = os.getenv("AUDIO_REGISTRY_DB", os.path.join("audios", "registry.sqlite3"))
+
+UPLOADED = "uploaded"
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audios (
+    audio_id TEXT PRIMARY KEY,
+    original_filename TEXT NOT NULL,
+    upload_path TEXT NOT NULL,
+    content_hash TEXT,
+    size_bytes INTEGER,
+    duration_sec REAL,
+    output_dir TEXT,
+    status TEXT NOT NULL DEFAULT 'uploaded',
+    stage TEXT,
+    percent REAL,
+    error TEXT,
+    params TEXT,
+    job_pid INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    queued_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    transcription_path TEXT,
+    transcription_engine TEXT,
+    transcription_sec REAL,
+    transcribed_at REAL,
+    decoded_path TEXT
+);
+CREATE INDEX IF NOT EXISTS audios_content_hash ON audios (content_hash);
+CREATE INDEX IF NOT EXISTS audios_created_at ON audios (created_at);
+CREATE INDEX IF NOT EXISTS audios_status ON audios (status, created_at);
+"""
+
+_COLUMNS = {
+    "original_filename", "upload_path", "content_hash", "size_bytes", "duration_sec", "output_dir",
+    "status", "stage", "percent", "error", "params", "job_pid", "queued_at", "started_at",
+    "finished_at", "transcription_path", "transcription_engine", "transcription_sec", "transcribed_at",
+    "decoded_path",
+}
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _row_to_dict(row: sqlite3.Row) -> dict:
+    record = dict(row)
+    record["params"] = json.loads(record["params"]) if record["params"] else None
+    return record
+
+
+class AudioRegistry:
+    """Thread-safe access to the registry database (one connection per thread)."""
+
+    def __init__(self, db_path: str = AUDIO_REGISTRY_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, audio_id: str, original_filename: str, upload_path: str, **fields) -> dict:
+        now = time.time()
+        fields = {k: v for k, v in fields.items() if k in _COLUMNS}
+        if fields.get("params") is not None:
+            fields["params"] = json.dumps(fields["params"], sort_keys=True)
+        columns = ["audio_id", "original_filename", "upload_path", "created_at", "updated_at", *fields]
+        values = [audio_id, original_filename, upload_path, now, now, *fields.values()]
+        self._connect().execute(
+            f"INSERT OR REPLACE INTO audios ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            values,
+        )
+        return self.get(audio_id)
+
+    def get(self, audio_id: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT * FROM audios WHERE audio_id = ?", (audio_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[dict]:
+        """The oldest audio with this content."""
+        row = self._connect().execute(
+            "SELECT * FROM audios WHERE content_hash = ? ORDER BY created_at LIMIT 1", (content_hash,)
+        ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def update(self, audio_id: str, **fields):
+        unknown = set(fields) - _COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown registry fields: {sorted(unknown)}")
+        if "params" in fields and fields["params"] is not None:
+            fields["params"] = json.dumps(fields["params"], sort_keys=True)
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        self._connect().execute(f"UPDATE audios SET {assignments} WHERE audio_id = ?",
+                                [*fields.values(), audio_id])
+
+    def delete(self, audio_id: str):
+        self._connect().execute("DELETE FROM audios WHERE audio_id = ?", (audio_id,))
+
+    def list(self, limit: int = 50, offset: int = 0, status: Optional[str] = None) -> Tuple[List[dict], int]:
+        """One page of audios, newest first, and the total number of matches."""
+        where, args = ("WHERE status = ?", [status]) if status else ("", [])
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM audios {where}", args).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM audios {where} ORDER BY created_at DESC, audio_id LIMIT ? OFFSET ?",
+            [*args, limit, offset],
+        ).fetchall()
+        return [_row_to_dict(r) for r in rows], total
+
+    def claim_job(self, audio_id: str, params: dict) -> bool:
+        """
+        Mark ``audio_id`` as queued by this process, unless another live
+        process already has a job queued or running for it.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status, job_pid FROM audios WHERE audio_id = ?", (audio_id,)).fetchone()
+            if row is not None and row["status"] in (QUEUED, RUNNING) and _pid_alive(row["job_pid"]):
+                conn.execute("ROLLBACK")
+                return False
+            now = time.time()
+            conn.execute(
+                "UPDATE audios SET status = ?, stage = NULL, percent = 0, error = NULL, params = ?, job_pid = ?,"
+                " queued_at = ?, started_at = NULL, finished_at = NULL, updated_at = ? WHERE audio_id = ?",
+                (QUEUED, json.dumps(params, sort_keys=True), os.getpid(), now, now, audio_id),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def job_active(self, record: Optional[dict]) -> bool:
+        """True if ``record`` has a queued or running job in a live process."""
+        return (record is not None and record["status"] in (QUEUED, RUNNING)
+                and _pid_alive(record["job_pid"]))
+
+    def fail_orphaned_jobs(self, pid: int):
+        """Jobs left queued or running by an earlier process with the same pid (after a restart)."""
+        self._connect().execute(
+            "UPDATE audios SET status = ?, error = ?, updated_at = ? WHERE job_pid = ? AND status IN (?, ?)",
+            (FAILED, "Interrupted by a server restart", time.time(), pid, QUEUED, RUNNING),
+        )
+
+    def reset_processing(self, audio_id: str):
+        """Forget the processing state, e.g. once the outputs were removed."""
+        self.update(audio_id, status=UPLOADED, stage=None, percent=None, error=None, params=None,
+                    job_pid=None, started_at=None, finished_at=None, queued_at=None)
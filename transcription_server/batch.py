@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Batch preprocessing and transcription of many recordings.
+
+Takes directories and/or glob patterns, and runs ``process_audio`` and the
+Vosk recognizer for every audio file on a process pool. The model is loaded
+once per worker (once in total with the default fork start method), files
+whose outputs are already up to date are skipped, and a JSON summary with
+per-file timings is written at the end.
+
+Usage:
+    python batch.py recordings/ --output-dir output --workers 4
+    python batch.py "semestre/**/*.mp3" --segment-min 5 --summary resumen.json
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+
+from model_registry import registry
+from preprocessor import process_audio
+from segments import load_segments
+from stitching import stitch_transcript
+from transcriber import recognize_segment
+import transcript_cache
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".aac", ".opus", ".webm")
+STAMP_NAME = "batch.json"
+
+_worker_model_path: Optional[str] = None
+
+
+def find_inputs(patterns: List[str], extensions=AUDIO_EXTENSIONS) -> List[str]:
+    """Audio files in the given directories (recursively) and glob patterns, sorted and unique."""
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                found.update(os.path.join(root, f) for f in files if f.lower().endswith(extensions))
+        else:
+            found.update(p for p in glob.glob(pattern, recursive=True)
+                         if os.path.isfile(p) and p.lower().endswith(extensions))
+    return sorted(os.path.abspath(p) for p in found)
+
+
+def output_names(paths: List[str]) -> List[str]:
+    """Output name per input: the file stem, plus a short path hash where stems collide."""
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    names = []
+    for path, stem in zip(paths, stems):
+        if stems.count(stem) > 1:
+            stem = f"{stem}-{hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]}"
+        names.append(stem)
+    return names
+
+
+def _stamp(input_file: str, params: dict, model_path: Optional[str]) -> dict:
+    st = os.stat(input_file)
+    return {
+        "source": input_file,
+        "source_size": st.st_size,
+        "source_mtime_ns": st.st_mtime_ns,
+        "params": params,
+        "model": os.path.basename(os.path.normpath(model_path)) if model_path else None,
+    }
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_up_to_date(input_file: str, output_dir: str, transcription_path: Optional[str],
+                  params: dict, model_path: Optional[str]) -> bool:
+    """True if the last run of this file used the same source, parameters and model."""
+    if transcription_path is not None and not os.path.exists(transcription_path):
+        return False
+    return _read_json(os.path.join(output_dir, STAMP_NAME)) == _stamp(input_file, params, model_path)
+
+
+def _init_worker(model_path: Optional[str]):
+    global _worker_model_path
+    _worker_model_path = model_path
+    if model_path:
+        # No-op when the model was inherited from the parent through fork
+        registry.get(model_path)
+
+
+def transcribe_output(name: str, output_dir: str, transcription_path: str) -> dict:
+    """Recognize every segment of ``output_dir`` with the worker's model and save the transcript."""
+    model = registry.get(_worker_model_path)
+    segments = load_segments(output_dir)
+    if not segments:
+        raise ValueError("No segments found")
+    recognized = [recognize_segment(model, segment) for segment in segments]
+    texts = [r["text"] for r in recognized]
+    complete_transcription, words = stitch_transcript(segments, texts, [r["words"] for r in recognized])
+    data = {
+        "audio_id": name,
+        "status": "completed",
+        "segments": [
+            {
+                "segment_path": segment.label,
+                "transcription": r["text"],
+                "duration_sec": segment.duration_sec,
+                "offset_sec": segment.offset_sec,
+                "words": r["words"],
+            }
+            for segment, r in zip(segments, recognized)
+        ],
+        "complete_transcription": complete_transcription,
+        "transcription_path": transcription_path,
+        "words": words or None,
+    }
+    tmp_path = transcription_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, transcription_path)
+    return data
+
+
+def run_file(input_file: str, name: str, output_root: str, transcriptions_dir: Optional[str],
+             params: dict, force: bool = False) -> dict:
+    """Preprocess and transcribe one file (in a worker); returns its summary entry."""
+    output_dir = os.path.join(output_root, name)
+    transcription_path = os.path.join(transcriptions_dir, f"{name}.json") if transcriptions_dir else None
+    result = {"file": input_file, "name": name, "output_dir": output_dir,
+              "transcription_path": transcription_path, "status": "done", "error": None,
+              "preprocess_sec": None, "transcribe_sec": None, "audio_sec": None, "words": None}
+
+    if not force and is_up_to_date(input_file, output_dir, transcription_path, params, _worker_model_path):
+        result["status"] = "skipped"
+        return result
+
+    try:
+        # A preprocessing run of the same source with the same parameters is
+        # reused (e.g. after a failed transcription)
+        st = os.stat(input_file)
+        recorded = dict(params, source_size=st.st_size, source_mtime_ns=st.st_mtime_ns)
+        if force or transcript_cache.load_params(output_dir) != recorded:
+            params_path = os.path.join(output_dir, transcript_cache.PARAMS_NAME)
+            if os.path.exists(params_path):
+                os.remove(params_path)
+            start = time.perf_counter()
+            if not process_audio(input_file, output_dir, **params):
+                raise RuntimeError("Preprocessing failed - check logs")
+            result["preprocess_sec"] = round(time.perf_counter() - start, 3)
+            transcript_cache.write_params(output_dir, recorded)
+
+        segments = load_segments(output_dir)
+        if segments:
+            result["audio_sec"] = round(max(s.offset_sec + s.duration_sec for s in segments), 3)
+
+        if transcription_path is not None:
+            start = time.perf_counter()
+            data = transcribe_output(name, output_dir, transcription_path)
+            result["transcribe_sec"] = round(time.perf_counter() - start, 3)
+            result["words"] = len(data["words"] or [])
+
+        with open(os.path.join(output_dir, STAMP_NAME), "w") as f:
+            json.dump(_stamp(input_file, params, _worker_model_path), f, indent=2)
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+
+    busy = (result["preprocess_sec"] or 0) + (result["transcribe_sec"] or 0)
+    if result["audio_sec"]:
+        result["rtf"] = round(busy / result["audio_sec"], 4)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch preprocessing and transcription")
+    parser.add_argument("inputs", nargs="+", help="Directories and/or glob patterns of audio files")
+    parser.add_argument("--output-dir", default="./output", help="Root of the per-file output directories [default: ./output]")
+    parser.add_argument("--transcriptions-dir", default="./transcriptions", help="Where the transcripts are written [default: ./transcriptions]")
+    parser.add_argument("--model", default="vosk-model-small-es-0.42", help="Vosk model path")
+    parser.add_argument("--no-transcribe", action="store_true", help="Only preprocess")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes [default: one per core]")
+    parser.add_argument("--force", action="store_true", help="Redo files whose outputs are up to date")
+    parser.add_argument("--summary", default=None, help="Summary JSON path [default: <output-dir>/batch_summary.json]")
+    parser.add_argument("--target-sr", type=int, default=16000, help="Target sample rate [default: 16000]")
+    parser.add_argument("--segment-min", type=int, default=15, help="Segment length in minutes [default: 15]")
+    parser.add_argument("--overlap-sec", type=int, default=30, help="Overlap between segments in seconds [default: 30]")
+    parser.add_argument("--gain", type=int, default=5, help="Volume gain in dB [default: 5]")
+    parser.add_argument("--no-noise-reduce", action="store_true", help="Skip noise reduction step")
+    parser.add_argument("--segment-mode", choices=["silence", "fixed"], default="silence", help="Cut segments at pauses or at fixed boundaries [default: silence]")
+    parser.add_argument("--resampler", choices=["auto", "polyphase", "soxr"], default=None, help="Sample-rate converter [default: auto]")
+    args = parser.parse_args()
+
+    files = find_inputs(args.inputs)
+    if not files:
+        print("No audio files found")
+        sys.exit(1)
+
+    model_path = None if args.no_transcribe else args.model
+    if model_path and not os.path.exists(model_path):
+        print(f"Error: Vosk model not found at {model_path}")
+        sys.exit(1)
+    transcriptions_dir = None if args.no_transcribe else args.transcriptions_dir
+    os.makedirs(args.output_dir, exist_ok=True)
+    if transcriptions_dir:
+        os.makedirs(transcriptions_dir, exist_ok=True)
+
+    params = {
+        "target_sr": args.target_sr,
+        "gain_db": args.gain,
+        "segment_min": args.segment_min,
+        "overlap_sec": args.overlap_sec,
+        "do_noise_reduction": not args.no_noise_reduce,
+        "do_segmentation": True,
+        "segment_mode": args.segment_mode,
+        "resampler": args.resampler,
+    }
+
+    start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    if model_path and start_method == "fork":
+        # Loaded once here and shared copy-on-write by every worker
+        registry.get(model_path)
+
+    print(f"Processing {len(files)} files with {args.workers} workers...")
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers,
+                             mp_context=multiprocessing.get_context(start_method),
+                             initializer=_init_worker, initargs=(model_path,)) as pool:
+        futures = {
+            pool.submit(run_file, path, name, args.output_dir, transcriptions_dir, params, args.force): path
+            for path, name in zip(files, output_names(files))
+        }
+        for i, future in enumerate(as_completed(futures), start=1):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process died
+                result = {"file": futures[future], "status": "failed", "error": str(e)}
+            results.append(result)
+            print(f"[{i}/{len(files)}] {result['status']}: {result['file']}"
+                  + (f" ({result['error']})" if result.get("error") else ""))
+
+    results.sort(key=lambda r: r["file"])
+    summary = {
+        "files": len(results),
+        "done": sum(r["status"] == "done" for r in results),
+        "skipped": sum(r["status"] == "skipped" for r in results),
+        "failed": sum(r["status"] == "failed" for r in results),
+        "wall_sec": round(time.perf_counter() - started, 3),
+        "workers": args.workers,
+        "model": model_path,
+        "params": params,
+        "results": results,
+    }
+    summary_path = args.summary or os.path.join(args.output_dir, "batch_summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    print(f"\n{summary['done']} done, {summary['skipped']} skipped, {summary['failed']} failed "
+          f"in {summary['wall_sec']:.1f}s. Summary: {summary_path}")
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark of the preprocessing stages and the recognizer loop.
+
+Generates a synthetic lecture-like recording (voiced syllables with pauses
+over background noise), then runs every ``process_audio`` stage and the
+recognizer loop, each in a fresh process, and reports per run:
+
+- ``rtf``: wall time / audio duration (below 1 is faster than real time)
+- ``peak_rss_mib`` and ``rss_growth_mib``: peak resident memory of the run,
+  and how much of it the run itself added
+- ``read_bytes`` / ``written_bytes``: bytes moved through read/write calls
+  (``rchar`` / ``wchar`` of ``/proc/self/io``; None where unavailable)
+
+The recognizer loop is swept over several ``chunk_frames`` values (the
+``readframes`` size fed to ``AcceptWaveform``), and run once more with the
+silence gate off (``skip_silence_sec`` 0); ``--dead-air`` adds long breaks
+to the recording to see what the gate saves. Without ``--model`` a stub
+recognizer is used, so the numbers measure the I/O and loop overhead and the
+benchmark runs on any CPU-only box.
+
+Usage:
+    python benchmark.py --duration-min 10 --output bench.json
+    python benchmark.py --model vosk-model-small-es-0.42 --chunk-frames 1000 4000 16000
+    python benchmark.py --model vosk-model-small-es-0.42 --dead-air 0.3 --skip convert volume
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+# Each run gets its own interpreter so memory and I/O figures do not leak between runs
+_mp = multiprocessing.get_context("spawn")
+
+
+def synthetic_lecture(duration_sec, sr=44100, seed=0, dead_air=0.0):
+    """
+    Mono float32 speech-like signal: 3-5 Hz syllables of a harmonic voice,
+    pauses and noise. The last ``dead_air`` of every minute is a break with
+    no voice at all.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration_sec * sr)
+    y = np.zeros(n, dtype=np.float32)
+    block = sr * 10
+    for start in range(0, n, block):
+        t = np.arange(start, min(start + block, n), dtype=np.float64) / sr
+        # Slowly drifting pitch with a few harmonics
+        f0 = 120 + 30 * np.sin(2 * np.pi * 0.2 * t)
+        phase = 2 * np.pi * np.cumsum(f0) / sr
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+        syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 2
+        # A pause of roughly half a second every ~6 seconds
+        talking = ((t % 6.0) < 5.4) & ((t % 60.0) < 60.0 * (1 - dead_air))
+        y[start:start + len(t)] = (0.3 * voice * syllables * talking).astype(np.float32)
+    y += rng.normal(0, 0.01, n).astype(np.float32)
+    return np.clip(y, -1.0, 1.0)
+
+
+class StubRecognizer:
+    """Drop-in for ``KaldiRecognizer`` that only touches the samples; one result per second."""
+
+    def __init__(self, model, sample_rate):
+        self.sample_rate = sample_rate
+        self.pending = 0
+        self.position = 0
+        self.energy = 0.0
+
+    def SetWords(self, enabled):
+        pass
+
+    def AcceptWaveform(self, data):
+        samples = np.frombuffer(data, dtype=np.int16)
+        self.energy += float(np.dot(samples, samples))
+        self.pending += len(samples)
+        return self.pending >= self.sample_rate
+
+    def _result(self):
+        start = self.position / self.sample_rate
+        self.position += self.pending
+        self.pending = 0
+        end = self.position / self.sample_rate
+        if end <= start:
+            return json.dumps({"text": ""})
+        return json.dumps({"text": "palabra",
+                           "result": [{"start": start, "end": end, "word": "palabra", "conf": 1.0}]})
+
+    def Result(self):
+        return self._result()
+
+    def FinalResult(self):
+        return self._result()
+
+
+def _io_counters():
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":") for line in f if ":" in line)
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM (Linux >= 4.0)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_stage(name, params, results):
+    """Body of one benchmark process: run stage ``name`` and report its figures."""
+    # Keep stdout for the JSON report
+    sys.stdout = sys.stderr
+    from model_registry import current_rss_bytes
+
+    if name == "recognize":
+        import transcriber
+        from segments import load_segments
+        if params["model"]:
+            from vosk import Model, SetLogLevel
+            SetLogLevel(-1)
+            model = Model(params["model"])
+        else:
+            transcriber.KaldiRecognizer = StubRecognizer
+            model = None
+        segments = load_segments(params["work_dir"])
+        skip_silence_sec = params["skip_silence_sec"]
+        if skip_silence_sec is None:
+            skip_silence_sec = params["skip_silence_sec"] = transcriber.RECOGNIZER_SKIP_SILENCE_SEC
+
+        def run():
+            words = 0
+            for segment in segments:
+                words += len(transcriber.recognize_segment(model, segment, params["chunk_frames"],
+                                                           skip_silence_sec)["words"])
+            return {"words": words, "skip_silence_sec": skip_silence_sec}
+    else:
+        import preprocessor
+        function = getattr(preprocessor, params["function"])
+
+        def run():
+            ok = function(*params["args"], **params.get("kwargs", {}))
+            return {"ok": ok is not False and ok is not None}
+
+    rss_before = current_rss_bytes()
+    _reset_peak_rss()
+    io_before = _io_counters()
+    start = time.perf_counter()
+    extra = run()
+    elapsed = time.perf_counter() - start
+    io_after = _io_counters()
+
+    result = {
+        "wall_sec": round(elapsed, 4),
+        "peak_rss_mib": round(_peak_rss_bytes() / 2 ** 20, 1),
+        "rss_growth_mib": round(max(_peak_rss_bytes() - rss_before, 0) / 2 ** 20, 1),
+        "read_bytes": io_after[0] - io_before[0] if io_before and io_after else None,
+        "written_bytes": io_after[1] - io_before[1] if io_before and io_after else None,
+        **extra,
+    }
+    results.put(result)
+
+
+def run_stage(name, params, duration_sec):
+    results = _mp.Queue()
+    proc = _mp.Process(target=_run_stage, args=(name, params, results))
+    proc.start()
+    try:
+        result = results.get(timeout=params.get("timeout", 3600))
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    proc.join()
+    if proc.exitcode:
+        result.setdefault("error", f"exit code {proc.exitcode}")
+    if "wall_sec" in result:
+        result["rtf"] = round(result["wall_sec"] / duration_sec, 5)
+    return {"stage": name, **{k: v for k, v in params.items() if k in ("chunk_frames", "skip_silence_sec", "mode")}, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcription path benchmark (machine-readable JSON output)")
+    parser.add_argument("--duration-min", type=float, default=5, help="Length of the synthetic recording in minutes [default: 5]")
+    parser.add_argument("--source-sr", type=int, default=44100, help="Sample rate of the synthetic recording [default: 44100]")
+    parser.add_argument("--target-sr", type=int, default=16000, help="Target sample rate [default: 16000]")
+    parser.add_argument("--segment-min", type=float, default=1, help="Segment length in minutes [default: 1]")
+    parser.add_argument("--overlap-sec", type=float, default=2, help="Overlap between segments in seconds [default: 2]")
+    parser.add_argument("--chunk-frames", type=int, nargs="+", default=[1000, 2000, 4000, 8000, 16000],
+                        help="readframes sizes to sweep in the recognizer loop")
+    parser.add_argument("--dead-air", type=float, default=0.0, help="Fraction of every minute without speech [default: 0]")
+    parser.add_argument("--skip-silence-sec", type=float, default=None,
+                        help="Silence gate of the recognizer loop [default: RECOGNIZER_SKIP_SILENCE_SEC]")
+    parser.add_argument("--resampler", choices=["auto", "polyphase", "soxr"], default=None, help="Sample-rate converter of the convert stage")
+    parser.add_argument("--model", default=None, help="Vosk model path (default: stub recognizer)")
+    parser.add_argument("--skip", nargs="*", default=[], help="Stages to skip")
+    parser.add_argument("--work-dir", default=None, help="Keep the generated files here instead of a temp dir")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    duration_sec = args.duration_min * 60
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="tutorly-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    here = os.path.dirname(os.path.abspath(__file__))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+
+    source = os.path.join(work_dir, "lecture.wav")
+    sf.write(source, synthetic_lecture(duration_sec, args.source_sr, dead_air=args.dead_air), args.source_sr, subtype="PCM_16")
+    converted = os.path.join(work_dir, "lecture_converted.wav")
+    volume = os.path.join(work_dir, "lecture_volume.wav")
+    clean = os.path.join(work_dir, "lecture_clean.wav")
+
+    stages = [
+        ("convert", {"function": "convert_to_wav_and_resample", "args": [source, converted, args.target_sr],
+                     "kwargs": {"resampler": args.resampler}}),
+        ("volume", {"function": "increase_volume_and_save", "args": [converted, volume, 5]}),
+        ("noise_reduction", {"function": "reduce_noise", "args": [volume, clean]}),
+        ("split_export", {"function": "split_audio",
+                          "args": [clean, os.path.join(work_dir, "export", "segments"), args.segment_min, args.overlap_sec, "lecture"],
+                          "kwargs": {"virtual": False, "manifest_dir": os.path.join(work_dir, "export"), "segment_mode": "fixed"}}),
+        ("split_virtual", {"function": "split_audio",
+                           "args": [clean, os.path.join(work_dir, "segments"), args.segment_min, args.overlap_sec, "lecture"],
+                           "kwargs": {"virtual": True, "manifest_dir": work_dir, "segment_mode": "silence"}}),
+        ("process_in_memory", {"function": "process_audio", "mode": "in_memory",
+                               "args": [source, os.path.join(work_dir, "pipeline_in_memory"), args.target_sr, 5,
+                                        args.segment_min, args.overlap_sec],
+                               "kwargs": {"in_memory": True}}),
+        ("process_per_stage", {"function": "process_audio", "mode": "per_stage",
+                               "args": [source, os.path.join(work_dir, "pipeline_per_stage"), args.target_sr, 5,
+                                        args.segment_min, args.overlap_sec],
+                               "kwargs": {"in_memory": False}}),
+    ]
+    recognize = {"work_dir": work_dir, "model": args.model}
+    stages += [("recognize", {**recognize, "chunk_frames": chunk, "skip_silence_sec": args.skip_silence_sec})
+               for chunk in args.chunk_frames]
+    if args.skip_silence_sec != 0:
+        # Same loop without the silence gate, for comparison
+        stages.append(("recognize", {**recognize, "chunk_frames": args.chunk_frames[len(args.chunk_frames) // 2],
+                                     "skip_silence_sec": 0}))
+
+    report = {
+        "benchmark": "tutorly-transcription",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "audio": {"duration_sec": duration_sec, "source_sr": args.source_sr, "target_sr": args.target_sr,
+                  "dead_air": args.dead_air},
+        "recognizer": args.model or "stub",
+        "runs": [],
+    }
+    try:
+        for name, params in stages:
+            if name in args.skip:
+                continue
+            print(f"Running {name} {params.get('chunk_frames', '')}".rstrip(), file=sys.stderr)
+            report["runs"].append(run_stage(name, params, duration_sec))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
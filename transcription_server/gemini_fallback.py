@@ -0,0 +1,120 @@
+"""
+Gemini fallback transcription.
+
+Segments are sent concurrently, at most ``GEMINI_CONCURRENCY`` at a time and
+no faster than the token bucket allows. Calls that fail with a
+``GoogleAPIError`` are retried with exponential backoff, and a segment that
+keeps failing is reported on its own instead of aborting the whole job.
+
+The model is passed in by the caller (anything with an async
+``generate_content_async``), so a local stub can stand in for the API.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Callable, List, Optional, Sequence
+
+import google.api_core.exceptions
+
+from segments import Segment, segment_wav_bytes
+
+GEMINI_PROMPT = "Transcribe este audio en español, se usa lenguaje técnico de una clase universitaria."
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "15"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+GEMINI_BACKOFF_BASE_SEC = float(os.getenv("GEMINI_BACKOFF_BASE_SEC", "2"))
+GEMINI_BACKOFF_MAX_SEC = float(os.getenv("GEMINI_BACKOFF_MAX_SEC", "60"))
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# One bucket per process so concurrent jobs share the API quota
+_bucket: Optional[TokenBucket] = None
+
+
+def get_bucket() -> TokenBucket:
+    global _bucket
+    if _bucket is None:
+        _bucket = TokenBucket(GEMINI_REQUESTS_PER_MINUTE / 60.0, capacity=GEMINI_CONCURRENCY)
+    return _bucket
+
+
+async def transcribe_segment_fallback(model, segment: Segment, bucket: Optional[TokenBucket] = None,
+                                      max_retries: int = GEMINI_MAX_RETRIES,
+                                      prompt: str = GEMINI_PROMPT) -> str:
+    """Transcribe one segment with Gemini, retrying API errors with exponential backoff."""
+    bucket = bucket or get_bucket()
+    audio_bytes = await asyncio.to_thread(segment_wav_bytes, segment)
+
+    attempt = 0
+    while True:
+        await bucket.acquire()
+        try:
+            response = await model.generate_content_async([
+                {"text": prompt},
+                {
+                    "mime_type": "audio/wav",
+                    "data": audio_bytes
+                }
+            ])
+            if not response.text:
+                raise ValueError("Respuesta vacía de Gemini")
+            return response.text.strip()
+        except google.api_core.exceptions.GoogleAPIError:
+            if attempt >= max_retries:
+                raise
+            delay = min(GEMINI_BACKOFF_MAX_SEC, GEMINI_BACKOFF_BASE_SEC * 2 ** attempt)
+            attempt += 1
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+
+async def transcribe_segments_fallback(model, segments: Sequence[Segment],
+                                       concurrency: int = GEMINI_CONCURRENCY,
+                                       bucket: Optional[TokenBucket] = None,
+                                       max_retries: int = GEMINI_MAX_RETRIES,
+                                       on_result: Optional[Callable[[int, dict], None]] = None) -> List[dict]:
+    """
+    Transcribe ``segments`` concurrently with Gemini.
+
+    Returns ``{"text": str, "error": Optional[str]}`` per segment, in order;
+    a segment whose retries are exhausted gets an empty text and its error.
+    ``on_result(index, result)`` is called as soon as each segment finishes.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index: int, segment: Segment) -> dict:
+        async with semaphore:
+            try:
+                text = await transcribe_segment_fallback(model, segment, bucket, max_retries)
+                result = {"text": text, "error": None}
+            except google.api_core.exceptions.GoogleAPIError as e:
+                result = {"text": "", "error": f"Error de la API de Gemini: {str(e)}"}
+            except Exception as e:
+                result = {"text": "", "error": f"Error en fallback Gemini: {str(e)}"}
+        if on_result is not None:
+            on_result(index, result)
+        return result
+
+    return await asyncio.gather(*[run(i, segment) for i, segment in enumerate(segments)])
@@ -0,0 +1,129 @@
+"""
+Background job queue for audio preprocessing.
+
+``/process`` only enqueues a job and returns; a bounded pool of worker threads
+runs the preprocessing pipeline and keeps a job record (status, stage and
+percent) up to date so ``/status`` can answer without touching the disk.
+Every change is also passed to the optional ``listener``, which persists it
+(see ``audio_registry.py``) for the other server processes; with a listener,
+finished jobs are then only kept there, not in memory.
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+# Concurrent preprocessing jobs and how many more may wait in the queue
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "32"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+@dataclass
+class JobRecord:
+    audio_id: str
+    status: str = QUEUED
+    stage: Optional[str] = None
+    percent: float = 0.0
+    error: Optional[str] = None
+    params: dict = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+
+class JobQueue:
+    """Runs one preprocessing job per audio_id on a bounded thread pool."""
+
+    def __init__(self, max_workers: int = PROCESS_WORKERS, max_queued: int = MAX_QUEUED_JOBS,
+                 listener: Optional[Callable[[JobRecord], None]] = None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="process-job")
+        self._max_queued = max_queued
+        self._jobs: Dict[str, JobRecord] = {}
+        self._lock = threading.Lock()
+        self._listener = listener
+
+    def _notify(self, job: JobRecord):
+        if self._listener is None:
+            return
+        try:
+            self._listener(job)
+        except Exception:
+            # Losing a progress update must not fail the job
+            traceback.print_exc()
+
+    def submit(self, audio_id: str, fn: Callable, params: Optional[dict] = None, **kwargs) -> JobRecord:
+        """
+        Enqueue ``fn(progress_callback=..., **kwargs)`` for ``audio_id``.
+
+        If a job for the same audio is already queued or running, that job is
+        returned instead of starting a second one.
+        """
+        with self._lock:
+            job = self._jobs.get(audio_id)
+            if job is not None and job.active:
+                return job
+            queued = sum(1 for j in self._jobs.values() if j.status == QUEUED)
+            if queued >= self._max_queued:
+                raise QueueFullError(f"Too many queued jobs ({queued})")
+            job = JobRecord(audio_id=audio_id, params=params or {})
+            self._jobs[audio_id] = job
+        self._notify(job)
+        self._executor.submit(self._run, job, fn, kwargs)
+        return job
+
+    def get(self, audio_id: str) -> Optional[JobRecord]:
+        return self._jobs.get(audio_id)
+
+    def forget(self, audio_id: str):
+        with self._lock:
+            job = self._jobs.get(audio_id)
+            if job is not None and not job.active:
+                del self._jobs[audio_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: JobRecord, fn: Callable, kwargs: dict):
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._notify(job)
+
+        def progress(stage: str, percent: float):
+            job.stage = stage
+            job.percent = round(float(percent), 1)
+            self._notify(job)
+
+        try:
+            if fn(progress_callback=progress, **kwargs):
+                job.status = COMPLETED
+                job.percent = 100.0
+            else:
+                job.status = FAILED
+                job.error = "Processing failed - check logs"
+        except Exception as e:
+            traceback.print_exc()
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self._notify(job)
+            if self._listener is not None:
+                # The listener has persisted the final state
+                self.forget(job.audio_id)
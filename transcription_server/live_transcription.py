@@ -0,0 +1,119 @@
+"""
+Live transcription over WebSocket.
+
+The client streams raw 16-bit mono PCM frames; every connection gets its own
+``KaldiRecognizer`` on the shared model and receives partial and final
+results as they are produced (the same loop as the microphone mode of
+``transcribe.py``).
+
+Incoming audio goes through a bounded queue: when recognition falls behind,
+the server stops reading from the socket, so TCP flow control slows the
+client down instead of buffering without limit.
+"""
+
+import asyncio
+import json
+import os
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+from vosk import KaldiRecognizer, Model
+
+LIVE_MAX_STREAMS = int(os.getenv("LIVE_MAX_STREAMS", "4"))
+LIVE_QUEUE_CHUNKS = int(os.getenv("LIVE_QUEUE_CHUNKS", "32"))
+LIVE_SAMPLE_RATE = 16000
+
+# Close code for "try again later" (RFC 6455 registry)
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class StreamLimiter:
+    """Non-blocking cap on the number of concurrent live streams."""
+
+    def __init__(self, max_streams: int = LIVE_MAX_STREAMS):
+        self.max_streams = max_streams
+        self.active = 0
+
+    def try_acquire(self) -> bool:
+        # Only touched from the event loop thread, no lock needed
+        if self.active >= self.max_streams:
+            return False
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active = max(self.active - 1, 0)
+
+
+def _is_end_message(text: str) -> bool:
+    if text.strip().upper() == "EOF":
+        return True
+    try:
+        return bool(json.loads(text).get("eof"))
+    except (ValueError, AttributeError):
+        return False
+
+
+async def _receive_audio(websocket: WebSocket, queue: asyncio.Queue):
+    """Move client frames into ``queue``; blocks (backpressure) while it is full."""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                await queue.put(message["bytes"])
+            elif message.get("text") is not None and _is_end_message(message["text"]):
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await queue.put(None)
+
+
+def _accept(rec: KaldiRecognizer, data: bytes) -> dict:
+    if rec.AcceptWaveform(data):
+        return {"type": "result", **json.loads(rec.Result())}
+    return {"type": "partial", **json.loads(rec.PartialResult())}
+
+
+async def run_live_session(websocket: WebSocket, model: Model, sample_rate: int = LIVE_SAMPLE_RATE,
+                           queue_chunks: int = LIVE_QUEUE_CHUNKS):
+    """Recognize the audio streamed on ``websocket`` until the client ends it."""
+    loop = asyncio.get_running_loop()
+    rec = KaldiRecognizer(model, sample_rate)
+    rec.SetWords(True)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_chunks)
+    receiver = asyncio.create_task(_receive_audio(websocket, queue))
+    last_partial: Optional[str] = None
+
+    try:
+        finished = False
+        while not finished:
+            chunks = [await queue.get()]
+            # Coalesce whatever else is already queued into one recognizer call
+            while not queue.empty() and chunks[-1] is not None:
+                chunks.append(queue.get_nowait())
+            if chunks[-1] is None:
+                finished = True
+                chunks.pop()
+            if not chunks:
+                continue
+
+            # Recognition is CPU-bound; keep it off the event loop
+            message = await loop.run_in_executor(None, _accept, rec, b"".join(chunks))
+            if message["type"] == "partial":
+                if message.get("partial") == last_partial:
+                    continue
+                last_partial = message.get("partial")
+            else:
+                last_partial = None
+            await websocket.send_json(message)
+
+        final = json.loads(await loop.run_in_executor(None, rec.FinalResult))
+        await websocket.send_json({"type": "final", **final})
+    except (WebSocketDisconnect, RuntimeError):
+        # Client went away mid-stream
+        pass
+    finally:
+        receiver.cancel()
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, FastAPI, UploadFile, File, HTTPException
+from fastapi import APIRouter, FastAPI, UploadFile, File, HTTPException, Query, Request, WebSocket
 from fastapi.responses import JSONResponse
+import asyncio
+import functools
 import json
 import os
 from dotenv import load_dotenv
@@ -8,19 +10,36 @@ from typing import List, Optional
 import uuid
 from pydantic import BaseModel
 import shutil
-import librosa
+import threading
+import time
 import uvicorn
-from typing import List, Dict
-from vosk import Model, KaldiRecognizer
-import wave
+import soundfile as sf
+from typing import List, Dict, Literal, Tuple
 from pathlib import Path
 from google.generativeai import configure, GenerativeModel
-import google.api_core.exceptions
 
 # Import your existing audio processing functions
 from preprocessor import (
     process_audio
 )
+import jobs
+import live_transcription as live
+import pipeline
+import singleflight
+import uploads
+import audio_registry
+import transcript_cache
+import transcript_index
+import storage
+from model_registry import registry as model_registry, preload as preload_models
+from gemini_fallback import transcribe_segments_fallback
+from segments import load_segments
+from stitching import stitch_transcript
+from transcriber import (
+    transcribe_segments,
+    get_pool as get_recognizer_pool,
+    shutdown_pool as shutdown_recognizer_pool
+)
 
 app = FastAPI(
     title="Audio Preprocessing API",
@@ -31,19 +50,98 @@ app = FastAPI(
 # Configuration
 load_dotenv()  # Load environment variables from .env
 AUDIO_UPLOAD_DIR = "audios"
+# 16 kHz mono WAVs decoded while the upload was arriving (upload?decode=true)
+DECODED_DIR = os.path.join(AUDIO_UPLOAD_DIR, "decoded")
 PROCESSED_DIR = "output"
 os.makedirs(AUDIO_UPLOAD_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 VOSK_MODEL_PATH = "vosk-model-small-es-0.42"  # Update with your model path
+# Extra models to load at startup, comma separated (VOSK_MODEL_PATH is always loaded)
+PRELOAD_MODEL_PATHS = [VOSK_MODEL_PATH] + [
+    p.strip() for p in os.getenv("VOSK_PRELOAD_MODELS", "").split(",") if p.strip()
+]
 TRANSCRIPTIONS_DIR = "transcriptions"
-os.makedirs(TRANSCRIPTIONS_DIR, exist_ok=True)
+# One lock file per audio, held while its transcript is computed and written
+TRANSCRIPTION_LOCKS_DIR = os.path.join(TRANSCRIPTIONS_DIR, "locks")
+os.makedirs(TRANSCRIPTION_LOCKS_DIR, exist_ok=True)
 GEMINI_MODEL_NAME = "gemini-1.5-flash" 
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
+gemini_model = None
 if GEMINI_API_KEY:
     configure(api_key=GEMINI_API_KEY)
     gemini_model = GenerativeModel(GEMINI_MODEL_NAME)
 
 transcribe_router = APIRouter(prefix="/transcribe", tags=["Transcription"])
+# Uploads, their artifacts and job state, shared by all worker processes
+audios = audio_registry.AudioRegistry()
+
+def persist_job(job: jobs.JobRecord):
+    """Mirror the state of a local job into the registry"""
+    audios.update(
+        job.audio_id,
+        status=job.status,
+        stage=job.stage,
+        percent=job.percent,
+        error=job.error,
+        started_at=job.started_at,
+        finished_at=job.finished_at
+    )
+
+job_queue = jobs.JobQueue(listener=persist_job)
+
+# Concurrent POST /transcribe calls for the same audio and engine share one run
+transcriptions_in_flight = singleflight.SingleFlight()
+
+def transcription_lock_path(audio_id: str) -> str:
+    """Lock held while an audio's outputs are rewritten or transcribed (by processing jobs too)"""
+    return os.path.join(TRANSCRIPTION_LOCKS_DIR, f"{audio_id}.lock")
+
+def processing_active(audio_id: str) -> bool:
+    job = job_queue.get(audio_id)
+    return (job is not None and job.active) or audios.job_active(audios.get(audio_id))
+
+def transcription_active(audio_id: str) -> bool:
+    return any(transcriptions_in_flight.active((audio_id, fallback)) for fallback in (False, True))
+
+def output_in_use(audio_id: str) -> bool:
+    return transcription_active(audio_id) or processing_active(audio_id)
+
+# Expired and least recently used outputs are removed in the background
+output_reaper = storage.Reaper(PROCESSED_DIR, is_busy=output_in_use, on_remove=audios.reset_processing,
+                               lock_path=transcription_lock_path)
+# Transcripts keyed by content, preprocessing, engine and model; segments by their PCM hash
+result_cache = transcript_cache.ResultCache(os.path.join(TRANSCRIPTIONS_DIR, "cache"))
+live_streams = live.StreamLimiter()
+model_load_error: Optional[str] = None
+
+@app.on_event("startup")
+async def load_models():
+    """Load the Vosk models once per process so requests share them"""
+    global model_load_error
+    model_load_error = preload_models(PRELOAD_MODEL_PATHS)
+    if model_load_error:
+        print(model_load_error)
+    else:
+        # Fork the recognizer workers now, while the model is loaded and shareable
+        # and before any job thread or request is running (get_pool waits for them)
+        get_recognizer_pool(VOSK_MODEL_PATH)
+    audios.fail_orphaned_jobs(os.getpid())
+    output_reaper.start()
+
+@app.on_event("shutdown")
+async def stop_workers():
+    output_reaper.stop()
+    shutdown_recognizer_pool()
+    job_queue.shutdown()
+
+@app.get("/models")
+async def get_loaded_models():
+    """Report the Vosk models loaded in this worker, with load time and resident size"""
+    return {
+        "pid": os.getpid(),
+        "models": model_registry.stats(),
+        "error": model_load_error
+    }
 
 class AudioProcessingRequest(BaseModel):
     target_sr: int = 16000
@@ -52,11 +150,19 @@ class AudioProcessingRequest(BaseModel):
     overlap_sec: int = 30
     do_noise_reduction: bool = True
     do_segmentation: bool = True
+    in_memory: bool = True  # decode once, write only the final segments
+    debug: bool = False  # also write the intermediate WAV files
+    virtual_segments: bool = True  # segment manifest instead of exported segment WAVs
+    segment_mode: Literal["silence", "fixed"] = "silence"  # "silence": cut at pauses, "fixed": fixed cuts with overlap
+    transcribe: bool = False  # pipelined: transcribe every segment as soon as it is cut (GET /transcribe/{id}/partial); exports segment WAVs
 
 class SegmentInfo(BaseModel):
     segment_path: str
     duration_sec: float
     size_bytes: int
+    start_frame: Optional[int] = None  # frame range inside the processed WAV
+    end_frame: Optional[int] = None
+    sha256: Optional[str] = None
 
 class AudioStatusResponse(BaseModel):
     audio_id: str
@@ -66,12 +172,41 @@ class AudioStatusResponse(BaseModel):
     volume_adjusted_path: Optional[str] = None
     noise_reduced_path: Optional[str] = None
     segments: Optional[List[SegmentInfo]] = None
+    stage: Optional[str] = None
+    percent: Optional[float] = None
+    error: Optional[str] = None
+    deduplicated: bool = False
+
+class AudioSummary(BaseModel):
+    audio_id: str
+    original_filename: str
+    status: str
+    stage: Optional[str] = None
+    percent: Optional[float] = None
     error: Optional[str] = None
+    size_bytes: Optional[int] = None
+    duration_sec: Optional[float] = None
+    params: Optional[dict] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    transcription_path: Optional[str] = None
+    transcription_engine: Optional[str] = None
+    transcription_sec: Optional[float] = None
+
+class AudioListResponse(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    items: List[AudioSummary]
 
 class TranscriptionSegment(BaseModel):
     segment_path: str
     transcription: str
     duration_sec: float
+    offset_sec: Optional[float] = None  # start of the segment in the processed recording
+    words: Optional[List[Tuple[float, float, str]]] = None  # [start_sec, end_sec, word]
+    error: Optional[str] = None  # set when this segment could not be transcribed
 
 class AudioTranscriptionResponse(BaseModel):
     audio_id: str
@@ -79,106 +214,362 @@ class AudioTranscriptionResponse(BaseModel):
     segments: List[TranscriptionSegment]
     complete_transcription: str
     transcription_path: str
+    # Word timings of complete_transcription, overlaps already merged
+    words: Optional[List[Tuple[float, float, str]]] = None
 
-@app.post("/upload", response_model=AudioStatusResponse)
-async def upload_audio(file: UploadFile = File(...)):
-    """Upload an audio file for processing"""
+class TranscriptSlice(BaseModel):
+    audio_id: str
+    total_words: int
+    duration_sec: float
+    offset: int  # index of the first word in the slice
+    next_offset: Optional[int] = None  # where the next page starts, None at the end
+    start_sec: Optional[float] = None
+    end_sec: Optional[float] = None
+    text: str
+    words: List[Tuple[float, float, str]]
+
+async def ingest_upload(chunks, original_filename: str, decode: bool = False) -> AudioStatusResponse:
+    """
+    Store an upload chunk by chunk (hashed and size checked in the same pass)
+    and register it; with ``decode`` the audio is also decoded to a 16 kHz
+    mono WAV while it arrives, so processing can start from it right away.
+    """
+    # Generate unique ID for this audio processing session
+    audio_id = str(uuid.uuid4())
+    file_ext = Path(original_filename).suffix.lower()
+    partial_path = os.path.join(AUDIO_UPLOAD_DIR, f".{audio_id}.part")
+    
+    decoder = None
+    if decode and uploads.StreamingDecoder.available():
+        decoder = uploads.StreamingDecoder(os.path.join(DECODED_DIR, f"{audio_id}.wav"))
+        await decoder.start()
     try:
-        # Generate unique ID for this audio processing session
-        audio_id = str(uuid.uuid4())
-        original_filename = file.filename
-        file_ext = Path(original_filename).suffix.lower()
+        content_hash, size_bytes = await uploads.save_upload(
+            chunks, partial_path,
+            max_bytes=uploads.max_upload_bytes(),
+            on_chunk=decoder.feed if decoder is not None else None
+        )
+    except BaseException:
+        if decoder is not None:
+            await decoder.abort()
+        raise
+    
+    try:
+        # Same recording uploaded before: reuse its audio_id and everything derived from it
+        existing = audios.find_by_hash(content_hash)
+        if existing is not None and os.path.exists(existing["upload_path"]):
+            if decoder is not None:
+                await decoder.abort()
+            response = await get_processing_status(existing["audio_id"])
+            response.deduplicated = True
+            return response
         
-        # Save the uploaded file
         upload_path = os.path.join(AUDIO_UPLOAD_DIR, f"{audio_id}{file_ext}")
-        with open(upload_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        return AudioStatusResponse(
-            audio_id=audio_id,
-            original_filename=original_filename,
-            processing_status="uploaded",
-            converted_path=None
-        )
+        os.replace(partial_path, upload_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    decoded_path = await decoder.finish() if decoder is not None else None
+    
+    audios.add(
+        audio_id,
+        original_filename,
+        upload_path,
+        content_hash=content_hash,
+        size_bytes=size_bytes,
+        duration_sec=await asyncio.to_thread(audio_duration, decoded_path or upload_path),
+        output_dir=os.path.join(PROCESSED_DIR, audio_id),
+        decoded_path=decoded_path
+    )
+    
+    return AudioStatusResponse(
+        audio_id=audio_id,
+        original_filename=original_filename,
+        processing_status="uploaded",
+        converted_path=None
+    )
+
+@app.post("/upload", response_model=AudioStatusResponse)
+async def upload_audio(file: UploadFile = File(...), decode: bool = False):
+    """Upload an audio file for processing"""
+    try:
+        return await ingest_upload(uploads.upload_chunks(file), file.filename, decode)
+    except uploads.UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
+
+@app.put("/upload/stream", response_model=AudioStatusResponse)
+async def upload_audio_stream(request: Request, filename: str = Query(..., min_length=1), decode: bool = False):
+    """
+    Upload an audio file as the raw request body. Unlike the multipart
+    upload, the body is not spooled first: it is written (and, with
+    ``decode``, decoded) while it is still arriving.
+    """
+    max_bytes = uploads.max_upload_bytes()
+    content_length = request.headers.get("content-length")
+    if max_bytes is not None and content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Upload is larger than {max_bytes / 2**20:.0f} MiB")
+    try:
+        return await ingest_upload(request.stream(), os.path.basename(filename), decode)
+    except uploads.UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
+def audio_duration(path: str) -> Optional[float]:
+    """Duration from the file header, when libsndfile can read the format"""
+    try:
+        return round(sf.info(path).duration, 3)
+    except Exception:
+        return None
+
+def find_audio(audio_id: str) -> Optional[dict]:
+    """
+    Registry record of an upload; uploads older than the registry are
+    registered on first use.
+    """
+    record = audios.get(audio_id)
+    if record is not None:
+        return record
+    uploaded_files = list(Path(AUDIO_UPLOAD_DIR).glob(f"{audio_id}.*"))
+    if not uploaded_files:
+        return None
+    upload = uploaded_files[0]
+    return audios.add(
+        audio_id,
+        upload.name,
+        str(upload),
+        size_bytes=upload.stat().st_size,
+        duration_sec=audio_duration(str(upload)),
+        output_dir=os.path.join(PROCESSED_DIR, audio_id)
+    )
+
+def stage_file(output_dir: str, base_name: str, stage: str) -> Optional[str]:
+    """A stage's output file, as WAV or as the FLAC the storage policy turned it into"""
+    wav_path = os.path.join(output_dir, f"{base_name}{storage.STAGE_SUFFIXES[stage]}")
+    for path in (wav_path, os.path.splitext(wav_path)[0] + ".flac"):
+        if os.path.exists(path):
+            return path
+    return None
+
+def collect_outputs(response: AudioStatusResponse, output_dir: str, base_name: str) -> AudioStatusResponse:
+    """Fill in the output files a finished processing job left in ``output_dir``"""
+    response.converted_path = stage_file(output_dir, base_name, "converted")
+    response.volume_adjusted_path = stage_file(output_dir, base_name, "volume")
+    response.noise_reduced_path = stage_file(output_dir, base_name, "clean")
+    
+    # Durations, sizes and checksums come from the segment manifest (cached)
+    segments = load_segments(output_dir)
+    if segments:
+        response.segments = [
+            SegmentInfo(
+                segment_path=seg.label,
+                duration_sec=seg.duration_sec,
+                size_bytes=seg.size_bytes,
+                start_frame=seg.start_frame if seg.virtual else None,
+                end_frame=seg.end_frame if seg.virtual else None,
+                sha256=seg.sha256
+            )
+            for seg in segments
+        ]
+    
+    return response
+
+def status_response(record: dict) -> AudioStatusResponse:
+    """Status of an audio from its registry record (job state shared by all workers)"""
+    output_dir = os.path.join(PROCESSED_DIR, record["audio_id"])
+    base_name = os.path.splitext(os.path.basename(record["upload_path"]))[0]
+    status, error = record["status"], record["error"]
+    
+    if status in (audio_registry.QUEUED, audio_registry.RUNNING) and not audios.job_active(record):
+        # The process running the job is gone
+        status, error = audio_registry.FAILED, error or "Processing was interrupted"
+    elif status == audio_registry.UPLOADED:
+        if not os.path.exists(output_dir):
+            error = "Not processed yet"
+        else:
+            # Processed before the registry existed
+            status = "processed"
+    
+    response = AudioStatusResponse(
+        audio_id=record["audio_id"],
+        original_filename=record["original_filename"],
+        processing_status=status,
+        stage=record["stage"],
+        percent=record["percent"],
+        error=error
+    )
+    if status in (audio_registry.COMPLETED, "processed"):
+        collect_outputs(response, output_dir, base_name)
+    return response
+
+@app.get("/audios", response_model=AudioListResponse)
+async def list_audios(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    status: Optional[str] = None
+):
+    """Uploaded audios, newest first, ``limit`` at a time"""
+    records, total = audios.list(limit=limit, offset=offset, status=status)
+    return AudioListResponse(
+        total=total,
+        offset=offset,
+        limit=limit,
+        items=[AudioSummary(**{k: record.get(k) for k in AudioSummary.__fields__}) for record in records]
+    )
+
 @app.get("/status/{audio_id}", response_model=AudioStatusResponse)
 async def get_processing_status(audio_id: str):
     """Check the status of an audio processing job and get output files"""
     try:
         # Check if the audio was uploaded
-        uploaded_files = list(Path(AUDIO_UPLOAD_DIR).glob(f"{audio_id}.*"))
-        if not uploaded_files:
+        record = find_audio(audio_id)
+        if record is None:
             raise HTTPException(status_code=404, detail="Audio file not found")
+        return status_response(record)
         
-        original_filename = uploaded_files[0].name
-        output_dir = os.path.join(PROCESSED_DIR, audio_id)
-        
-        if not os.path.exists(output_dir):
-            return AudioStatusResponse(
-                audio_id=audio_id,
-                original_filename=original_filename,
-                processing_status="uploaded",
-                error="Not processed yet"
-            )
-        
-        # Check what processing steps have been completed
-        base_name = os.path.splitext(original_filename)[0]
-        response = AudioStatusResponse(
-            audio_id=audio_id,
-            original_filename=original_filename,
-            processing_status="processed"
-        )
-        
-        # Check for each processing step's output
-        converted_path = os.path.join(output_dir, f"{base_name}_converted.wav")
-        if os.path.exists(converted_path):
-            response.converted_path = converted_path
-        
-        volume_path = os.path.join(output_dir, f"{base_name}_volume.wav")
-        if os.path.exists(volume_path):
-            response.volume_adjusted_path = volume_path
-        
-        clean_path = os.path.join(output_dir, f"{base_name}_clean.wav")
-        if os.path.exists(clean_path):
-            response.noise_reduced_path = clean_path
-        
-        # Check for segments
-        segments_dir = os.path.join(output_dir, "segments")
-        if os.path.exists(segments_dir):
-            segments = []
-            for seg_file in Path(segments_dir).glob("*.wav"):
-                duration = librosa.get_duration(filename=str(seg_file))
-                segments.append(SegmentInfo(
-                    segment_path=str(seg_file),
-                    duration_sec=duration,
-                    size_bytes=os.path.getsize(seg_file)
-                ))
-            response.segments = segments
-        
-        return response
-        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error checking status: {str(e)}")
     
-@app.post("/process/{audio_id}", response_model=AudioStatusResponse)
+def run_processing(record_params: dict, output_dir: str, progress_callback=None, **kwargs) -> bool:
+    """Run the preprocessing pipeline, record the parameters of a successful run and apply the storage policy"""
+    # Waits for a transcription of this audio in any worker: it reads the files rewritten here
+    with singleflight.file_lock(transcription_lock_path(os.path.basename(output_dir))):
+        return process_outputs(record_params, output_dir, progress_callback, **kwargs)
+
+def process_outputs(record_params: dict, output_dir: str, progress_callback=None, **kwargs) -> bool:
+    params_path = os.path.join(output_dir, transcript_cache.PARAMS_NAME)
+    if os.path.exists(params_path):
+        os.remove(params_path)
+    if not process_audio(output_dir=output_dir, progress_callback=progress_callback, **kwargs):
+        return False
+    transcript_cache.write_params(output_dir, record_params)
+    # Intermediate stage files: keep, compress or delete them (debug runs keep everything)
+    if not kwargs.get("debug"):
+        base_name = os.path.splitext(os.path.basename(kwargs["input_file"]))[0]
+        storage.apply_policy(output_dir, base_name)
+    return True
+
+def run_pipeline(audio_id: str, record_params: dict, output_dir: str, progress_callback=None, **kwargs) -> bool:
+    """
+    Preprocess and transcribe in one pass: every segment goes to the recognizer
+    pool as soon as it is cut, while the rest of the audio is still being
+    cleaned, and the text so far is served by GET /transcribe/{audio_id}/partial
+    """
+    with singleflight.file_lock(transcription_lock_path(audio_id)):
+        return pipeline_outputs(audio_id, record_params, output_dir, progress_callback, **kwargs)
+
+def pipeline_outputs(audio_id: str, record_params: dict, output_dir: str, progress_callback=None, **kwargs) -> bool:
+    params_path = os.path.join(output_dir, transcript_cache.PARAMS_NAME)
+    if os.path.exists(params_path):
+        os.remove(params_path)
+    engine, model_version = "vosk", os.path.basename(os.path.normpath(VOSK_MODEL_PATH))
+    
+    def cached(segment):
+        key = segment_cache_key(segment, engine, model_version)
+        entry = result_cache.get(key) if key else None
+        return transcript_cache.segment_result(entry, segment.offset_sec) if entry is not None else None
+    
+    def checkpoint(segment, result):
+        key = segment_cache_key(segment, engine, model_version)
+        if key:
+            result_cache.put(key, transcript_cache.segment_entry(result["words"], result["text"], segment.offset_sec))
+    
+    def progress(stage: str, percent: float):
+        # The job is not done until the last segment is transcribed
+        if progress_callback and stage != "done":
+            progress_callback(stage, percent)
+    
+    started = time.perf_counter()
+    run = pipeline.PipelinedTranscription(
+        audio_id,
+        VOSK_MODEL_PATH,
+        pipeline.partial_path(TRANSCRIPTIONS_DIR, audio_id),
+        os.path.join(TRANSCRIPTIONS_DIR, f"{audio_id}.json"),
+        cached=cached,
+        on_result=checkpoint
+    )
+    run.discard_partial()
+    if not process_audio(output_dir=output_dir, progress_callback=progress, streaming=True,
+                         on_segment=run.add, **kwargs):
+        return False
+    transcript_cache.write_params(output_dir, record_params)
+    
+    if not run.segments:
+        raise RuntimeError("No segments were cut from the audio")
+    
+    progress("transcribing", 95)
+    recognized = run.wait()
+    data = finish_transcription(audio_id, run.segments, recognized, engine,
+                                transcript_key(audio_id, output_dir, engine, model_version), started)
+    if data["status"] != "completed":
+        failed = sum(1 for r in recognized if r.get("error"))
+        raise RuntimeError(f"{failed} segments could not be transcribed; POST /transcribe/{audio_id} retries them")
+    run.discard_partial()
+    if progress_callback:
+        progress_callback("done", 100)
+    return True
+
+@app.post("/process/{audio_id}", response_model=AudioStatusResponse, status_code=202)
 async def process_audio_endpoint(
     audio_id: str,
     params: AudioProcessingRequest = AudioProcessingRequest()
 ):
-    """Process an uploaded audio file with the given parameters"""
+    """Queue an uploaded audio file for processing; poll /status/{audio_id} for progress"""
     try:
         # Find the uploaded file
-        uploaded_files = list(Path(AUDIO_UPLOAD_DIR).glob(f"{audio_id}.*"))
-        if not uploaded_files:
+        record = find_audio(audio_id)
+        if record is None:
             raise HTTPException(status_code=404, detail="Audio file not found")
-        
-        input_file = str(uploaded_files[0])
-        original_filename = uploaded_files[0].name
+        if params.transcribe:
+            # The pipelined run cuts and exports segment WAVs block by block:
+            # there is nothing to transcribe without segmentation, and no
+            # single processed WAV or intermediate stage files to write
+            if not params.do_segmentation:
+                raise HTTPException(status_code=422, detail="transcribe requires do_segmentation")
+            if params.debug:
+                raise HTTPException(status_code=422, detail="transcribe does not support debug")
+            if "virtual_segments" in params.__fields_set__ and params.virtual_segments:
+                raise HTTPException(status_code=422, detail="transcribe exports segment WAVs; set virtual_segments to false")
+        
+        input_file = record["upload_path"]
+        # Decoded during the upload at the target rate: skip the decode step
+        decoded_path = record.get("decoded_path")
+        if decoded_path and os.path.exists(decoded_path) and params.target_sr == uploads.DECODE_SAMPLE_RATE:
+            input_file = decoded_path
         output_dir = os.path.join(PROCESSED_DIR, audio_id)
-        # Run the processing pipeline
-        success = process_audio(
+        
+        # Already running here or in another worker process
+        if processing_active(audio_id):
+            return status_response(record)
+        # Its segments are being read; a transcription in another worker makes the job wait for it
+        if transcription_active(audio_id):
+            raise HTTPException(status_code=409, detail="Audio is being transcribed; retry when it finishes")
+        
+        # Already processed with these settings (and transcribed, if asked): nothing to recompute
+        record_params = params.dict(exclude={"transcribe"})
+        transcription_path = os.path.join(TRANSCRIPTIONS_DIR, f"{audio_id}.json")
+        if transcript_cache.load_params(output_dir) == record_params and (
+                not params.transcribe or os.path.exists(transcription_path)):
+            return status_response(record)
+        if params.transcribe and not os.path.exists(VOSK_MODEL_PATH):
+            raise HTTPException(status_code=500, detail=f"Vosk model not found at {VOSK_MODEL_PATH}")
+        
+        if not audios.claim_job(audio_id, params.dict()):
+            return status_response(audios.get(audio_id))
+        target = functools.partial(run_pipeline, audio_id) if params.transcribe else run_processing
+        job = job_queue.submit(
+            audio_id,
+            target,
+            params=params.dict(),
+            record_params=record_params,
             input_file=input_file,
             output_dir=output_dir,
             target_sr=params.target_sr,
@@ -186,60 +577,26 @@ async def process_audio_endpoint(
             segment_min=params.segment_min,
             overlap_sec=params.overlap_sec,
             do_noise_reduction=params.do_noise_reduction,
-            do_segmentation=params.do_segmentation
+            do_segmentation=params.do_segmentation,
+            in_memory=params.in_memory,
+            debug=params.debug,
+            virtual_segments=params.virtual_segments,
+            segment_mode=params.segment_mode
         )
         
-        if not success:
-            return AudioStatusResponse(
-                audio_id=audio_id,
-                original_filename=original_filename,
-                processing_status="failed",
-                error="Processing failed - check logs"
-            )
-        
-        # Prepare response with all generated files
-        response = AudioStatusResponse(
+        return AudioStatusResponse(
             audio_id=audio_id,
-            original_filename=original_filename,
-            processing_status="completed"
+            original_filename=record["original_filename"],
+            processing_status=job.status,
+            stage=job.stage,
+            percent=job.percent
         )
         
-        # Check for each processing step's output
-        base_name = os.path.splitext(original_filename)[0]
-        
-        # Converted file
-        converted_path = os.path.join(output_dir, f"{base_name}_converted.wav")
-        if os.path.exists(converted_path):
-            response.converted_path = converted_path
-        
-        # Volume adjusted file
-        volume_path = os.path.join(output_dir, f"{base_name}_volume.wav")
-        if os.path.exists(volume_path):
-            response.volume_adjusted_path = volume_path
-        
-        # Noise reduced file
-        if params.do_noise_reduction:
-            clean_path = os.path.join(output_dir, f"{base_name}_clean.wav")
-            if os.path.exists(clean_path):
-                response.noise_reduced_path = clean_path
-        
-        # Segments
-        if params.do_segmentation:
-            segments_dir = os.path.join(output_dir, "segments")
-            if os.path.exists(segments_dir):
-                segments = []
-                for seg_file in Path(segments_dir).glob("*.wav"):
-                    # Get duration using librosa
-                    duration = librosa.get_duration(filename=str(seg_file))
-                    segments.append(SegmentInfo(
-                        segment_path=str(seg_file),
-                        duration_sec=duration,
-                        size_bytes=os.path.getsize(seg_file)
-                    ))
-                response.segments = segments
-        
-        return response
-        
+    except jobs.QueueFullError as e:
+        audios.reset_processing(audio_id)
+        raise HTTPException(status_code=503, detail=f"Processing queue is full: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
     
@@ -249,9 +606,15 @@ async def cleanup_audio(audio_id: str):
     """Remove all files associated with an audio processing job"""
     try:
         # Delete uploaded file
-        uploaded_files = list(Path(AUDIO_UPLOAD_DIR).glob(f"{audio_id}.*"))
-        for f in uploaded_files:
-            f.unlink()
+        record = find_audio(audio_id)
+        if record is not None:
+            for path in (record["upload_path"], record.get("decoded_path"),
+                         pipeline.partial_path(TRANSCRIPTIONS_DIR, audio_id), transcription_lock_path(audio_id)):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        
+        job_queue.forget(audio_id)
+        audios.delete(audio_id)
         
         # Delete processed files
         processed_dir = os.path.join(PROCESSED_DIR, audio_id)
@@ -262,156 +625,283 @@ async def cleanup_audio(audio_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+def content_hash(audio_id: str) -> Optional[str]:
+    """Content hash of an upload, hashing (and registering) uploads older than the hash column"""
+    record = find_audio(audio_id)
+    if record is None:
+        return None
+    if record["content_hash"]:
+        return record["content_hash"]
+    digest = uploads.hash_file(record["upload_path"])
+    audios.update(audio_id, content_hash=digest)
+    return digest
+
+def save_transcription(transcription_path: str, data: dict):
+    """
+    Latest transcript of an audio, as served by GET /transcribe/{audio_id}, and
+    its word index. Written to a temp file and renamed, so readers never see
+    a half-written transcript.
+    """
+    tmp_path = f"{transcription_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, transcription_path)
+    words_path = transcript_index.index_path(TRANSCRIPTIONS_DIR, data["audio_id"])
+    if data.get("words"):
+        transcript_index.write_index(words_path, data["words"])
+    elif os.path.exists(words_path):
+        os.remove(words_path)
+
+def segment_cache_key(segment, engine: str, model_version: str) -> Optional[str]:
+    """Result cache key of one segment's audio (None for segments without a checksum)"""
+    if not segment.sha256:
+        return None
+    return transcript_cache.cache_key("segment", segment.sha256, engine, model_version)
+
+def transcript_key(audio_id: str, output_dir: str, engine: str, model_version: str) -> str:
+    """Result cache key of a whole transcript: same audio, preprocessing, engine and model"""
+    return transcript_cache.cache_key(
+        "transcript", content_hash(audio_id),
+        transcript_cache.preprocessing_params(transcript_cache.load_params(output_dir)),
+        engine, model_version
+    )
+
+def finish_transcription(audio_id: str, segments: list, recognized: List[dict], engine: str,
+                         key: str, started: float, with_words: bool = True) -> dict:
+    """
+    Stitch the per-segment results into the transcript of ``audio_id``. It is
+    cached and saved only when every segment succeeded; a partial result is
+    just returned, so a retry transcribes only the failed segments.
+    """
+    transcription_path = os.path.join(TRANSCRIPTIONS_DIR, f"{audio_id}.json")
+    segment_words = [r["words"] for r in recognized] if with_words else None
+    transcriptions = [r["text"] for r in recognized]
+    errors = [r.get("error") for r in recognized]
+    
+    results = []
+    
+    for i, (segment, transcription) in enumerate(zip(segments, transcriptions)):
+        results.append(TranscriptionSegment(
+            segment_path=segment.label,
+            transcription=transcription,
+            duration_sec=segment.duration_sec,
+            offset_sec=segment.offset_sec,
+            words=segment_words[i] if segment_words is not None else None,
+            error=errors[i]
+        ))
+    
+    # Combine all transcriptions, keeping overlapping audio only once
+    complete_transcription, words = stitch_transcript(segments, transcriptions, segment_words)
+    
+    # Save results
+    failed = any(errors)
+    response_data = {
+        "audio_id": audio_id,
+        "status": "partial" if failed else "completed",
+        "segments": [seg.dict() for seg in results],
+        "complete_transcription": complete_transcription,
+        "transcription_path": transcription_path,
+        "words": words or None
+    }
+    
+    if not failed:
+        result_cache.put(key, response_data)
+        save_transcription(transcription_path, response_data)
+        audios.update(
+            audio_id,
+            transcription_path=transcription_path,
+            transcription_engine=engine,
+            transcription_sec=round(time.perf_counter() - started, 3),
+            transcribed_at=time.time()
+        )
+    return response_data
+
 @transcribe_router.post("/{audio_id}", response_model=AudioTranscriptionResponse)
 async def transcribe_audio(audio_id: str, use_fallback: bool = False):
     """
     Transcribe all segments for a given audio ID.
-    If already transcribed, returns existing transcriptions.
+    If the same audio was already transcribed with the same preprocessing,
+    engine and model, returns the cached transcription; otherwise only the
+    segments not in the cache are transcribed.
+
+    A request arriving while the same audio is being transcribed with the
+    same engine waits for that run and gets its result; in another worker
+    process it waits for the run's lock and then hits the cache.
+    While the audio is being (re)processed the segments are not final: 409.
     """
+    if not os.path.exists(os.path.join(PROCESSED_DIR, audio_id)):
+        raise HTTPException(status_code=404, detail="Audio segments not found")
+    if processing_active(audio_id):
+        raise HTTPException(status_code=409, detail="Audio is being processed; poll /status and retry")
+    
+    async def run():
+        async with singleflight.async_file_lock(transcription_lock_path(audio_id)):
+            return await run_transcription(audio_id, use_fallback)
+    
+    return await transcriptions_in_flight.run((audio_id, use_fallback), run)
+
+async def run_transcription(audio_id: str, use_fallback: bool) -> AudioTranscriptionResponse:
+    """Body of POST /transcribe/{audio_id}, run by one request at a time per audio"""
     try:
         # Check if audio exists
-        segments_dir = os.path.join(PROCESSED_DIR, audio_id, "segments")
-        if not os.path.exists(segments_dir):
+        output_dir = os.path.join(PROCESSED_DIR, audio_id)
+        if not os.path.exists(output_dir):
             raise HTTPException(status_code=404, detail="Audio segments not found")
+        storage.touch(output_dir)
         
-        # Load Vosk model (do this once at startup in production)
+        # Shared model, loaded once at startup (or on first use)
         if not os.path.exists(VOSK_MODEL_PATH):
             raise HTTPException(
                 status_code=500,
                 detail=f"Vosk model not found at {VOSK_MODEL_PATH}"
             )
         
-        model = Model(VOSK_MODEL_PATH)
-        
         # Prepare output paths
         transcription_path = os.path.join(TRANSCRIPTIONS_DIR, f"{audio_id}.json")
         
-        # Check if already transcribed
-        if os.path.exists(transcription_path):
-            with open(transcription_path, "r") as f:
-                existing_data = json.load(f)
-            return AudioTranscriptionResponse(**existing_data)
-        
-        # Get all segment files
-        segment_files = sorted(Path(segments_dir).glob("*.wav"))
-        if not segment_files:
+        # Same audio, preprocessing, engine and model as an earlier run: reuse its result
+        engine = "gemini" if use_fallback else "vosk"
+        model_version = GEMINI_MODEL_NAME if use_fallback else os.path.basename(os.path.normpath(VOSK_MODEL_PATH))
+        key = transcript_key(audio_id, output_dir, engine, model_version)
+        cached = result_cache.get(key)
+        if cached is not None:
+            cached["transcription_path"] = transcription_path
+            save_transcription(transcription_path, cached)
+            audios.update(audio_id, transcription_path=transcription_path, transcription_engine=engine)
+            return AudioTranscriptionResponse(**cached)
+        started = time.perf_counter()
+        
+        # Segment ranges from the manifest (or the exported segment files)
+        segments = load_segments(output_dir)
+        if not segments:
             raise HTTPException(
                 status_code=404,
                 detail="No segment files found"
             )
         
-        results = []
-        full_transcription = []
-        
-        for segment_file in segment_files:
-            # Transcribe each segment
-            segment_path = str(segment_file)
-            if not use_fallback:
-                transcription = transcribe_segment(model, segment_path)
-            else:
-                transcription = await transcribe_segment_fallback(segment_path)
-
-            
-            # Get duration
-            duration = librosa.get_duration(filename=segment_path)
-            
-            results.append(TranscriptionSegment(
-                segment_path=segment_path,
-                transcription=transcription,
-                duration_sec=duration
-            ))
-            
-            full_transcription.append(transcription)
-        
-        # Combine all transcriptions
-        complete_transcription = " ".join(full_transcription)
-        
-        # Save results
-        response_data = {
-            "audio_id": audio_id,
-            "status": "completed",
-            "segments": [seg.dict() for seg in results],
-            "complete_transcription": complete_transcription,
-            "transcription_path": transcription_path
-        }
-        
-        with open(transcription_path, "w") as f:
-            json.dump(response_data, f, indent=2, ensure_ascii=False)
-        
+        # Segments whose audio was already transcribed by this engine and model
+        # (including the checkpoints of an interrupted earlier run)
+        segment_keys = [segment_cache_key(seg, engine, model_version) for seg in segments]
+        recognized: List[Optional[dict]] = [None] * len(segments)
+        for i, seg_key in enumerate(segment_keys):
+            entry = result_cache.get(seg_key) if seg_key else None
+            if entry is not None:
+                recognized[i] = transcript_cache.segment_result(entry, segments[i].offset_sec)
+        missing = [i for i, r in enumerate(recognized) if r is None]
+        pending = [segments[i] for i in missing]
+        
+        def checkpoint(pending_index: int, result: dict):
+            # Commit every finished segment right away, so a crash or a failed
+            # segment never throws away the recognition work already done
+            i = missing[pending_index]
+            if use_fallback:
+                result["words"] = None
+            recognized[i] = result
+            if segment_keys[i] and not result.get("error"):
+                result_cache.put(segment_keys[i], transcript_cache.segment_entry(
+                    result["words"], result["text"], segments[i].offset_sec))
+        
+        if pending and not use_fallback:
+            # Segments run in parallel on the recognizer pool
+            await transcribe_segments(VOSK_MODEL_PATH, pending, on_result=checkpoint)
+        elif pending:
+            if gemini_model is None:
+                raise HTTPException(status_code=503, detail="Gemini fallback is not configured (GOOGLE_API_KEY)")
+            # Concurrent, rate limited; failed segments come back with an error
+            await transcribe_segments_fallback(gemini_model, pending, on_result=checkpoint)
+        
+        response_data = finish_transcription(audio_id, segments, recognized, engine, key, started,
+                                             with_words=not use_fallback)
         return AudioTranscriptionResponse(**response_data)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Transcription failed: {str(e)}"
         )
 
-def transcribe_segment(model: Model, segment_path: str) -> str:
-    """Transcribe a single audio segment using Vosk"""
+@transcribe_router.websocket("/live")
+async def live_transcription(websocket: WebSocket, sample_rate: int = live.LIVE_SAMPLE_RATE):
+    """
+    Live transcription: send binary frames of 16-bit mono PCM (16 kHz by
+    default) and a text "EOF" to finish. The server answers with
+    {"type": "partial" | "result" | "final", ...} messages as it goes.
+    """
+    await websocket.accept()
+    if not live_streams.try_acquire():
+        await websocket.close(code=live.CLOSE_TRY_AGAIN_LATER, reason="Too many live streams")
+        return
     try:
-        with wave.open(segment_path, 'rb') as wf:
-            # Verify audio format
-            if wf.getnchannels() != 1:
-                raise ValueError("Audio must be mono")
-            if wf.getsampwidth() != 2:
-                raise ValueError("Audio must be 16-bit")
-            
-            samplerate = wf.getframerate()
-            rec = KaldiRecognizer(model, samplerate)
-            rec.SetWords(True)
-            
-            full_text = []
-            
-            while True:
-                data = wf.readframes(4000)
-                if len(data) == 0:
-                    break
-                if rec.AcceptWaveform(data):
-                    result = json.loads(rec.Result())
-                    if result.get("text"):
-                        full_text.append(result["text"])
-            
-            # Get final result
-            final_result = json.loads(rec.FinalResult())
-            if final_result.get("text"):
-                full_text.append(final_result["text"])
-            
-            return " ".join(full_text).strip()
-    
+        model = model_registry.get(VOSK_MODEL_PATH)
+        await live.run_live_session(websocket, model, sample_rate)
+        await websocket.close()
     except Exception as e:
-        raise ValueError(f"Error transcribing {segment_path}: {str(e)}")
-
-async def transcribe_segment_fallback(audio_path: str) -> str:
-    try:
-        prompt = "Transcribe este audio en español, se usa lenguaje técnico de una clase universitaria."
-
-        with open(audio_path, "rb") as f:
-            audio_bytes = f.read()
+        await websocket.close(code=1011, reason=f"Live transcription failed: {str(e)}"[:120])
+    finally:
+        live_streams.release()
 
-        response = await gemini_model.generate_content_async([
-            {"text": prompt},
-            {
-                "mime_type": "audio/wav",
-                "data": audio_bytes
-            }
-        ])
-
-        if not response.text:
-            raise ValueError("Respuesta vacía de Gemini")
+@transcribe_router.get("/{audio_id}/words", response_model=TranscriptSlice)
+async def get_transcript_slice(
+    audio_id: str,
+    start_sec: Optional[float] = Query(None, ge=0),
+    end_sec: Optional[float] = Query(None, ge=0),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000)
+):
+    """
+    A slice of the transcript: the words overlapping [start_sec, end_sec), or
+    ``limit`` words from word ``offset``. Long ranges are paged; follow
+    ``next_offset`` to get the rest.
+    """
+    words_path = transcript_index.index_path(TRANSCRIPTIONS_DIR, audio_id)
+    index = transcript_index.load_index(words_path)
+    if index is None:
+        # Transcripts saved before the index existed
+        transcription_path = os.path.join(TRANSCRIPTIONS_DIR, f"{audio_id}.json")
+        if not os.path.exists(transcription_path):
+            raise HTTPException(status_code=404, detail="Transcription not found for this audio ID")
+        with open(transcription_path, "r") as f:
+            words = json.load(f).get("words")
+        if not words:
+            raise HTTPException(status_code=404, detail="This transcription has no word timings")
+        index = transcript_index.write_index(words_path, words)
+    
+    first, stop = 0, len(index)
+    if start_sec is not None or end_sec is not None:
+        first, stop = index.time_range(start_sec or 0.0, end_sec if end_sec is not None else float("inf"))
+    first = max(first, offset)
+    page_end = min(stop, first + limit)
+    
+    return TranscriptSlice(
+        audio_id=audio_id,
+        total_words=len(index),
+        duration_sec=round(index.duration_sec, 2),
+        offset=first,
+        next_offset=page_end if page_end < stop else None,
+        start_sec=start_sec,
+        end_sec=end_sec,
+        text=index.text(first, page_end),
+        words=index.words(first, page_end)
+    )
 
-        return response.text.strip()
+@transcribe_router.get("/{audio_id}/partial", response_model=AudioTranscriptionResponse)
+async def get_partial_transcription(audio_id: str):
+    """
+    Transcript of the segments a pipelined /process run (``transcribe``) has
+    finished so far, with status "in_progress"; the final transcript once
+    the run is done.
+    """
+    data = pipeline.load_partial(pipeline.partial_path(TRANSCRIPTIONS_DIR, audio_id))
+    if data is None:
+        transcription_path = os.path.join(TRANSCRIPTIONS_DIR, f"{audio_id}.json")
+        if not os.path.exists(transcription_path):
+            raise HTTPException(status_code=404, detail="No transcription in progress for this audio ID")
+        with open(transcription_path, "r") as f:
+            data = json.load(f)
+    return AudioTranscriptionResponse(**data)
 
-    except google.api_core.exceptions.GoogleAPIError as e:
-        raise HTTPException(
-            status_code=502,
-            detail=f"Error de la API de Gemini: {str(e)}"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error en fallback Gemini: {str(e)}"
-        )
-    
 @transcribe_router.get("/{audio_id}", response_model=AudioTranscriptionResponse)
 async def get_transcription_status(audio_id: str):
     """
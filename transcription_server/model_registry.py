@@ -0,0 +1,110 @@
+"""
+Process-wide registry of loaded Vosk models.
+
+Loading a Vosk model takes seconds and hundreds of MB, so every model path is
+loaded exactly once per process and the same ``Model`` instance is handed to
+every request. Models loaded at startup (before any worker pool is forked) are
+inherited by the child processes copy-on-write instead of being loaded again.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from vosk import Model
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of the current process in bytes (0 if unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            # ru_maxrss is the high-water mark (KB on Linux), the best we can do here
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except Exception:
+            return 0
+
+
+@dataclass
+class LoadedModel:
+    path: str
+    model: Model
+    load_time_sec: float
+    resident_bytes: int
+    loaded_at: float
+    pid: int
+
+
+class ModelRegistry:
+    """Loads each Vosk model once and shares it across requests."""
+
+    def __init__(self):
+        self._models: Dict[str, LoadedModel] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_path: str) -> Model:
+        """Return the shared model for ``model_path``, loading it on first use."""
+        return self.load(model_path).model
+
+    def load(self, model_path: str) -> LoadedModel:
+        key = os.path.abspath(model_path)
+        entry = self._models.get(key)
+        if entry is not None:
+            return entry
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                return entry
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"Vosk model not found at {model_path}")
+
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            model = Model(model_path)
+            load_time = time.perf_counter() - start
+
+            entry = LoadedModel(
+                path=model_path,
+                model=model,
+                load_time_sec=load_time,
+                resident_bytes=max(current_rss_bytes() - rss_before, 0),
+                loaded_at=time.time(),
+                pid=os.getpid(),
+            )
+            self._models[key] = entry
+            print(f"Vosk model loaded from {model_path} in {load_time:.2f}s "
+                  f"(~{entry.resident_bytes / 2**20:.1f} MiB resident)")
+            return entry
+
+    def stats(self) -> List[dict]:
+        """Load time and resident size of every model loaded in this process."""
+        return [
+            {
+                "path": entry.path,
+                "load_time_sec": round(entry.load_time_sec, 3),
+                "resident_bytes": entry.resident_bytes,
+                "loaded_at": entry.loaded_at,
+                "pid": entry.pid,
+            }
+            for entry in self._models.values()
+        ]
+
+
+# Shared instance used by the API and the worker processes
+registry = ModelRegistry()
+
+
+def preload(model_paths: List[str]) -> Optional[str]:
+    """Load every model in ``model_paths``; returns an error message on failure."""
+    for path in model_paths:
+        try:
+            registry.load(path)
+        except Exception as e:
+            return f"Could not load Vosk model {path}: {e}"
+    return None
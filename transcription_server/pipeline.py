@@ -0,0 +1,134 @@
+"""
+Pipelined preprocessing and transcription.
+
+``preprocessor.process_audio_streaming`` cuts segments while the rest of
+the recording is still being decoded and cleaned. ``PipelinedTranscription``
+sends each segment to the recognizer pool as soon as it is cut, and after
+every finished segment rewrites ``transcriptions/{audio_id}.partial.json``
+with the text so far. Partial text is therefore available minutes before the
+whole recording is processed, and recognition overlaps with preprocessing
+instead of waiting for it.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import Future, wait
+from typing import Callable, Dict, List, Optional
+
+from segments import Segment
+from stitching import stitch_transcript
+from transcriber import submit_segment
+
+PARTIAL_SUFFIX = ".partial.json"
+
+
+def partial_path(transcriptions_dir: str, audio_id: str) -> str:
+    return os.path.join(transcriptions_dir, f"{audio_id}{PARTIAL_SUFFIX}")
+
+
+def load_partial(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class PipelinedTranscription:
+    """
+    Recognition of the segments of one recording as they are produced.
+
+    ``cached(segment)`` may return an earlier result of the same audio
+    (which is then not recognized again); ``on_result(segment, result)`` is
+    called for every newly recognized segment, e.g. to checkpoint it.
+    """
+
+    def __init__(self, audio_id: str, model_path: str, partial_path: str, transcription_path: str,
+                 cached: Optional[Callable[[Segment], Optional[dict]]] = None,
+                 on_result: Optional[Callable[[Segment, dict], None]] = None):
+        self.audio_id = audio_id
+        self.model_path = model_path
+        self.partial_path = partial_path
+        self.transcription_path = transcription_path
+        self.cached = cached
+        self.on_result = on_result
+        self.segments: List[Segment] = []
+        self.results: Dict[int, dict] = {}
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+
+    def add(self, segment: Segment):
+        """Start recognizing ``segment`` (use as the ``on_segment`` callback)."""
+        with self._lock:
+            self.segments.append(segment)
+        result = self.cached(segment) if self.cached is not None else None
+        if result is not None:
+            self._record(segment, result)
+            return
+        future = submit_segment(self.model_path, segment)
+        future.add_done_callback(lambda f: self._done(segment, f))
+        self._futures.append(future)
+
+    def wait(self) -> List[dict]:
+        """Results of all segments added so far, in order, once they are all done."""
+        wait(self._futures)
+        with self._lock:
+            return [self.results[s.index] for s in self.segments]
+
+    def discard_partial(self):
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+
+    def _done(self, segment: Segment, future: Future):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"text": "", "words": [], "error": str(e)}
+        if self.on_result is not None and not result.get("error"):
+            try:
+                self.on_result(segment, result)
+            except Exception as e:
+                print(f"Segment checkpoint failed for {segment.label}: {e}")
+        self._record(segment, result)
+
+    def _record(self, segment: Segment, result: dict):
+        with self._lock:
+            self.results[segment.index] = result
+            try:
+                self._write_partial()
+            except OSError as e:
+                print(f"Could not write partial transcript of {self.audio_id}: {e}")
+
+    def _write_partial(self):
+        done = [s for s in self.segments if s.index in self.results]
+        # Stitched text only over the leading run of finished segments, so it never has holes
+        prefix = []
+        for segment in self.segments:
+            if segment.index not in self.results:
+                break
+            prefix.append(segment)
+        texts = [self.results[s.index]["text"] for s in prefix]
+        complete_transcription, words = stitch_transcript(prefix, texts, [self.results[s.index]["words"] for s in prefix])
+        data = {
+            "audio_id": self.audio_id,
+            "status": "in_progress",
+            "segments": [
+                {
+                    "segment_path": s.label,
+                    "transcription": self.results[s.index]["text"],
+                    "duration_sec": s.duration_sec,
+                    "offset_sec": s.offset_sec,
+                    "words": self.results[s.index]["words"],
+                    "error": self.results[s.index].get("error"),
+                }
+                for s in done
+            ],
+            "complete_transcription": complete_transcription,
+            "transcription_path": self.transcription_path,
+            "words": words or None,
+        }
+        tmp_path = self.partial_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.partial_path)
@@ -19,29 +19,127 @@ Options:
     --target-sr RATE       Target sample rate [default: 16000]
     --segment-min MIN      Segment length in minutes [default: 15]
     --overlap-sec SEC      Overlap between segments in seconds [default: 30]
+    --segment-mode MODE    silence: cut at pauses, fixed: fixed cuts with overlap [default: silence]
     --gain DB              Volume gain in dB [default: 5]
     --no-noise-reduce      Skip noise reduction step
     --no-segment           Skip segmentation step
+    --per-stage-files      Decode and write a WAV at every stage (legacy pipeline)
+    --debug                Write intermediate WAVs in the in-memory pipeline
+    --export-segments      Export segment WAVs instead of a segment manifest
+    --resampler NAME       auto, polyphase or soxr [default: auto]
+    --streaming            Process block by block, exporting each segment as soon as it is cut
 """
 
 import os
+import shutil
+import subprocess
 from glob import glob
-import librosa
 import soundfile as sf
 import numpy as np
 from pydub import AudioSegment
-from pydub.silence import split_on_silence
-from scipy.signal import medfilt
+from scipy.signal import get_window
+from scipy.fft import rfft, irfft
+from contextlib import contextmanager
+import threading
+import time
+import tracemalloc
+
+from resampler import RESAMPLE_CHUNK_FRAMES, resample_blocks
+from segments import (StreamingSegmenter, clear_segments, exported_segment, segment_ranges, silence_ranges,
+                      write_manifest)
 import wave
 import argparse
 
 
 """# Conversión de formato del audio"""
 
-def convert_to_wav_and_resample(audio_path, output_path="/content/output.wav", target_samplerate=16000, codec="pcm_s16le"):
+def read_audio_blocks(audio_path, block_frames=RESAMPLE_CHUNK_FRAMES):
+    """
+    Abre un archivo de audio y devuelve (tasa, canales, generador de bloques mono float32).
+
+    Los formatos que soporta libsndfile (WAV, FLAC, OGG...) se leen bloque a
+    bloque sin cargar el archivo completo; el resto (MP3, M4A, AAC...) se
+    decodifica con ffmpeg a un pipe, también por bloques, o con pydub si
+    ffmpeg no está instalado.
+    """
+    try:
+        info = sf.info(audio_path)
+    except RuntimeError:
+        info = None
+
+    if info is not None:
+        def blocks():
+            for block in sf.blocks(audio_path, blocksize=block_frames, dtype="float32", always_2d=True):
+                yield block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+        return info.samplerate, info.channels, blocks()
+
+    if shutil.which("ffmpeg") is not None:
+        return read_ffmpeg_blocks(audio_path, block_frames)
+
+    audio = AudioSegment.from_file(audio_path)
+    if audio.sample_width in (1, 2, 4):
+        # Una vista del buffer decodificado, sin una segunda copia completa
+        dtype = {1: np.int8, 2: np.int16, 4: np.int32}[audio.sample_width]
+        samples = np.frombuffer(audio.raw_data, dtype=dtype).reshape(-1, audio.channels)
+    else:
+        samples = np.array(audio.get_array_of_samples()).reshape(-1, audio.channels)
+    scale = float(1 << (8 * audio.sample_width - 1))
+
+    def blocks():
+        for start in range(0, len(samples), block_frames):
+            block = samples[start:start + block_frames].astype(np.float32)
+            block = block.mean(axis=1) if audio.channels > 1 else block[:, 0]
+            yield block / scale
+    return audio.frame_rate, audio.channels, blocks()
+
+
+def read_ffmpeg_blocks(audio_path, block_frames=RESAMPLE_CHUNK_FRAMES):
+    """
+    ``read_audio_blocks`` para formatos que libsndfile no lee: ffmpeg escribe
+    un WAV de 16 bits a un pipe y se lee bloque a bloque, así que la memoria
+    no depende de la duración del archivo.
+    """
+    proc = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-i", audio_path,
+         "-vn", "-map_metadata", "-1", "-f", "wav", "-c:a", "pcm_s16le", "pipe:1"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        # La cabecera trae la tasa y los canales originales
+        wav = wave.open(proc.stdout, "rb")
+    except (EOFError, wave.Error):
+        proc.kill()
+        proc.wait()
+        raise RuntimeError(f"ffmpeg no pudo decodificar {audio_path}")
+    channels = wav.getnchannels()
+
+    def blocks():
+        finished = False
+        try:
+            while True:
+                data = wav.readframes(block_frames)
+                if not data:
+                    break
+                block = np.frombuffer(data, dtype=np.int16).reshape(-1, channels).astype(np.float32)
+                block = block.mean(axis=1) if channels > 1 else block[:, 0]
+                yield block / 32768.0
+            finished = True
+        finally:
+            # Quien lee dejó de pedir bloques: no esperar al resto del archivo
+            if not finished:
+                proc.kill()
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg falló al decodificar {audio_path} (código {returncode})")
+    return wav.getframerate(), channels, blocks()
+
+
+def convert_to_wav_and_resample(audio_path, output_path="/content/output.wav", target_samplerate=16000,
+                                codec="pcm_s16le", resampler=None):
     """
     Convierte un archivo de audio a formato WAV, mono, 16-bit,
-    y lo remuestrea a la tasa de muestreo objetivo usando pydub.
+    y lo remuestrea a la tasa de muestreo objetivo por bloques
+    (ver ``resampler.py``), sin pasar por pydub cuando libsndfile lee el formato.
 
     Args:
         audio_path (str): La ruta al archivo de audio de entrada.
@@ -51,50 +149,33 @@ def convert_to_wav_and_resample(audio_path, output_path="/content/output.wav", t
                                              Por defecto, 16000.
         codec (str, opcional): El codec de audio a usar para la conversión.
                                Por defecto, "pcm_s16le" (WAV estándar 16-bit).
+        resampler (str, opcional): "auto", "polyphase" o "soxr". Por defecto, ``RESAMPLER``.
 
     Returns:
         str or None: La ruta al archivo WAV convertido si fue exitoso, None si hubo un error.
     """
     try:
         print(f"Cargando archivo de audio: {audio_path}...")
-        # Detecta automáticamente el formato del archivo de entrada
-        audio = AudioSegment.from_file(audio_path)
-        print(f"Archivo original cargado. Duración: {len(audio)/1000:.2f}s, Canales: {audio.channels}, Tasa: {audio.frame_rate}Hz, Ancho de muestra: {audio.sample_width*8}-bit")
-
-        # 1. Remuestrear a la tasa de muestreo objetivo
-        if audio.frame_rate != target_samplerate:
-            print(f"Remuestreando de {audio.frame_rate} Hz a {target_samplerate} Hz...")
-            audio = audio.set_frame_rate(target_samplerate)
-            print(f"Remuestreo completado. Nueva tasa: {audio.frame_rate}Hz")
-
-        # 2. Convertir a mono (1 canal)
-        if audio.channels != 1:
-            print(f"Convirtiendo de {audio.channels} canales a mono...")
-            audio = audio.set_channels(1)
-            print("Conversión a mono completada.")
+        sr, channels, blocks = read_audio_blocks(audio_path)
+        print(f"Archivo original: Canales: {channels}, Tasa: {sr}Hz")
 
         # Asegurarse de que el directorio de salida existe
         output_dir = os.path.dirname(output_path)
         if output_dir and not os.path.exists(output_dir): # Comprobar si output_dir no es vacío
              os.makedirs(output_dir, exist_ok=True)
 
-
-        # Exporta al formato WAV con el codec y parámetros especificados
-        print(f"Exportando a WAV con codec '{codec}'...")
-        audio.export(output_path, format="wav", codec=codec)
-
-        print(f"Archivo convertido y remuestreado exitosamente a WAV: {output_path}")
-
-        # Verificar propiedades del archivo de salida
-        with wave.open(output_path, 'rb') as wf_check:
-            print(f"Propiedades del archivo de salida '{output_path}':")
-            print(f"  Canales: {wf_check.getnchannels()}")
-            print(f"  Tasa de muestreo: {wf_check.getframerate()} Hz")
-            print(f"  Ancho de muestra: {wf_check.
-            getsampwidth()*8}-bit")
-            print(f"  Tipo de compresión: {wf_check.getcomptype()}")
-
-        # Audio(output_path) # Descomenta si quieres reproducirlo en Colab
+        subtype = {"pcm_s16le": "PCM_16", "pcm_s24le": "PCM_24", "pcm_s32le": "PCM_32"}.get(codec, "PCM_16")
+        start = time.perf_counter()
+        frames = 0
+        with sf.SoundFile(output_path, "w", samplerate=target_samplerate, channels=1, subtype=subtype) as out:
+            if sr != target_samplerate:
+                blocks = resample_blocks(blocks, sr, target_samplerate, resampler)
+            for block in blocks:
+                out.write(block)
+                frames += len(block)
+        elapsed = time.perf_counter() - start
+        print(f"Convertido y remuestreado de {sr} Hz a {target_samplerate} Hz en {elapsed:.2f}s "
+              f"(RTF {elapsed / max(frames / target_samplerate, 1e-9):.4f}): {output_path}")
         return output_path
 
     except Exception as e:
@@ -130,56 +211,284 @@ def increase_volume_and_save(input_path, output_path, gain_db):
 
 
 
-def reduce_noise(input_path, output_path):
+def reduce_noise(input_path, output_path, noise_start_sec=0.0, noise_duration_sec=0.1,
+                 noise_frames=None, block_frames=256):
     """
     Aplica reducción de ruido espectral a un archivo de audio.
 
     Este método realiza una reducción de ruido básica basada en el análisis espectral del audio.
-    Asume que el ruido está presente al principio del archivo y crea una máscara para atenuar
-    las frecuencias dominadas por el ruido.
+    Asume que el ruido está presente en la ventana ``[noise_start_sec, noise_start_sec +
+    noise_duration_sec)`` (por defecto al principio del archivo) y crea una máscara para
+    atenuar las frecuencias dominadas por el ruido.
+
+    El archivo se procesa por bloques de ``block_frames`` tramas STFT, así que la memoria
+    usada no depende de la duración del audio.
 
     Args:
-        file_path (str): La ruta al archivo de audio de entrada.
-        output_file_path (str, optional): La ruta al archivo de audio de salida.
-                                           Por defecto, "/content/audio_sin_ruido.wav".
+        input_path (str): La ruta al archivo de audio de entrada.
+        output_path (str): La ruta al archivo de audio de salida.
+        noise_start_sec (float, optional): Inicio de la ventana de ruido en segundos.
+        noise_duration_sec (float, optional): Duración de la ventana de ruido en segundos.
+        noise_frames (int, optional): Número de tramas STFT de ruido; reemplaza a
+                                      ``noise_duration_sec`` si se indica.
+        block_frames (int, optional): Tramas STFT procesadas por bloque.
     """
     try:
-        # 1. Cargar el archivo de audio
-        y, sr = librosa.load(input_path, sr=None)
+        with track_peak_memory() as peak, \
+                sf.SoundFile(input_path) as src:
+            sr = src.samplerate
+            gate = StreamingSpectralGate(
+                sr, noise_start_sec=noise_start_sec, noise_duration_sec=noise_duration_sec,
+                noise_frames=noise_frames, block_frames=block_frames
+            )
+            with sf.SoundFile(output_path, "w", samplerate=sr, channels=1, subtype="PCM_16") as dst:
+                for block in src.blocks(blocksize=block_frames * gate.hop_length, dtype="float32"):
+                    if block.ndim > 1:
+                        block = block.mean(axis=1)
+                    dst.write(gate.process(block))
+                dst.write(gate.flush())
+
+        print(f"Noise reduced audio saved to: {output_path} (peak memory {peak.mib:.1f} MiB)")
+        return output_path
 
-        # 2. Análisis de magnitud y fase
-        S_full, phase = librosa.magphase(librosa.stft(y))
+    except Exception as e:
+        print(f"Error durante la reducción de ruido: {e}")
+        raise  # Re-lanza la excepción para que se propague
+        return None
 
-        # 3. Estimación del ruido (promedio de los primeros 0.1 segundos)
-        noise = np.mean(S_full[:, :int(sr*0.1)], axis=1)
 
-        # 4. Creación de una máscara binaria
-        mask = S_full > noise[:, None]
+def reduce_noise_array(y, sr, noise_start_sec=0.0, noise_duration_sec=0.1,
+                       noise_frames=None, block_frames=256):
+    """
+    Reducción de ruido espectral sobre un buffer ya cargado en memoria.
 
-        # 5. Convertir la máscara a tipo float
-        mask = mask.astype(float)
+    Usa el mismo procesamiento por bloques que ``reduce_noise``: además de la
+    señal de salida solo se reserva memoria para un bloque de tramas STFT.
 
-        # 6. Aplicar un filtro de mediana para suavizar la máscara
-        mask = medfilt(mask, kernel_size=(1,5))
+    Args:
+        y (np.ndarray): Señal mono en punto flotante.
+        sr (int): Tasa de muestreo de la señal.
 
-        # 7. Aplicar la máscara a la magnitud
-        S_clean = S_full * mask
+    Returns:
+        np.ndarray: La señal limpia.
+    """
+    with track_peak_memory() as peak:
+        gate = StreamingSpectralGate(
+            sr, noise_start_sec=noise_start_sec, noise_duration_sec=noise_duration_sec,
+            noise_frames=noise_frames, block_frames=block_frames
+        )
+        y_clean = np.empty(max(len(y), 0), dtype=np.float32)
+        written = 0
+        step = block_frames * gate.hop_length
+        for start in range(0, len(y), step):
+            out = gate.process(y[start:start + step])
+            y_clean[written:written + len(out)] = out
+            written += len(out)
+        out = gate.flush()
+        y_clean[written:written + len(out)] = out
+        written += len(out)
+
+    print(f"Noise reduction done (peak memory {peak.mib:.1f} MiB)")
+    return y_clean[:written]
+
+
+class StreamingSpectralGate:
+    """
+    Compuerta espectral por bloques (STFT / overlap-add).
 
-        # 8. Reconstrucción de la señal de audio
-        y_clean = librosa.istft(S_clean * phase)
+    Reproduce el algoritmo original (STFT centrada con ventana Hann, máscara
+    binaria contra el perfil de ruido, mediana de 5 tramas sobre la máscara e
+    ISTFT) pero recibiendo el audio por partes: ``process`` devuelve las muestras
+    ya completas y ``flush`` el resto al terminar la señal.
+    """
 
-        # 9. Guardar el archivo de audio limpio
-        sf.write(output_path, y_clean, sr)
-        print(f"Noise reduced audio saved to: {output_path}")
-        return output_path
+    def __init__(self, sr, n_fft=2048, hop_length=512, block_frames=256,
+                 noise_start_sec=0.0, noise_duration_sec=0.1, noise_frames=None,
+                 median_kernel=5):
+        if n_fft % hop_length:
+            raise ValueError("n_fft must be a multiple of hop_length")
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.block_frames = block_frames
+        self.window = get_window("hann", n_fft, fftbins=True).astype(np.float32)
+        self._half = median_kernel // 2
+
+        # Ventana del perfil de ruido, en tramas STFT
+        self._noise_start = int(round(noise_start_sec * sr / hop_length))
+        if noise_frames is None:
+            noise_frames = int(np.ceil(noise_duration_sec * sr / hop_length))
+        self._noise_end = self._noise_start + max(int(noise_frames), 1)
+        self.noise = None
+
+        # Muestras de entrada (en coordenadas de la señal con relleno) aún sin enmarcar
+        self._pending = np.zeros(n_fft // 2, dtype=np.float32)
+        self._frames_seen = 0
+        # Espectros esperando el perfil de ruido
+        self._unmasked = []
+        self._unmasked_frames = 0
+        # Espectros y máscaras esperando el contexto de la mediana
+        self._spec = np.zeros((0, n_fft // 2 + 1), dtype=np.complex64)
+        self._mask = np.zeros((self._half, n_fft // 2 + 1), dtype=np.int8)
+        self._next_frame = 0
+        # Acumuladores overlap-add desde la muestra ``_ola_start``
+        self._ola = np.zeros(n_fft, dtype=np.float32)
+        self._wss = np.zeros(n_fft, dtype=np.float32)
+        self._ola_start = 0
+        self._emitted = n_fft // 2  # se descarta el relleno inicial
+
+    def process(self, x):
+        """Agrega muestras de entrada y devuelve las muestras limpias ya completas."""
+        self._pending = np.concatenate([self._pending, np.asarray(x, dtype=np.float32)])
+        self._analyze(final=False)
+        return self._emit(final=False)
+
+    def flush(self):
+        """Termina la señal y devuelve las muestras restantes."""
+        self._pending = np.concatenate([self._pending, np.zeros(self.n_fft // 2, dtype=np.float32)])
+        self._analyze(final=True)
+        return self._emit(final=True)
+
+    def _analyze(self, final):
+        n_fft, hop = self.n_fft, self.hop_length
+        available = 0 if len(self._pending) < n_fft else 1 + (len(self._pending) - n_fft) // hop
+        while available >= self.block_frames or (final and available > 0):
+            count = available if final else self.block_frames
+            frames = np.lib.stride_tricks.sliding_window_view(
+                self._pending[:(count - 1) * hop + n_fft], n_fft)[::hop]
+            spec = rfft(frames * self.window, axis=1).astype(np.complex64)
+            self._pending = self._pending[count * hop:]
+            self._frames_seen += count
+            available -= count
+            self._add_spectra(spec, final=False)
+        if final:
+            self._add_spectra(None, final=True)
+
+    def _add_spectra(self, spec, final):
+        if self.noise is None:
+            if spec is not None:
+                self._unmasked.append(spec)
+                self._unmasked_frames += len(spec)
+            if self._unmasked_frames < self._noise_end and not final:
+                return
+            held = np.concatenate(self._unmasked) if self._unmasked else self._spec[:0]
+            self._unmasked = []
+            profile = np.abs(held[self._noise_start:self._noise_end])
+            if len(profile) == 0:
+                profile = np.abs(held)
+            self.noise = profile.mean(axis=0) if len(profile) else np.zeros(held.shape[1], dtype=np.float32)
+            spec = held
+        if spec is not None and len(spec):
+            self._spec = np.concatenate([self._spec, spec])
+            mask = (np.abs(spec) > self.noise).astype(np.int8)
+            self._mask = np.concatenate([self._mask, mask])
+        self._synthesize(final)
+
+    def _synthesize(self, final):
+        half = self._half
+        mask = self._mask
+        if final:
+            mask = np.concatenate([mask, np.zeros((half, mask.shape[1]), dtype=np.int8)])
+        ready = len(mask) - 2 * half
+        if ready <= 0:
+            return
+
+        # Mediana de una máscara binaria = mayoría dentro de la ventana
+        csum = np.concatenate([np.zeros((1, mask.shape[1]), dtype=np.int32),
+                               np.cumsum(mask, axis=0, dtype=np.int32)])
+        votes = csum[2 * half + 1:2 * half + 1 + ready] - csum[:ready]
+        smooth = (votes > half).astype(np.float32)
+
+        frames = irfft(self._spec[:ready] * smooth, n=self.n_fft, axis=1).astype(np.float32)
+        frames *= self.window
+        self._overlap_add(frames)
+
+        self._spec = self._spec[ready:]
+        self._mask = self._mask[ready:]
+        self._next_frame += ready
+
+    def _overlap_add(self, frames):
+        n_fft, hop = self.n_fft, self.hop_length
+        ratio = n_fft // hop
+        count = len(frames)
+        start = self._next_frame * hop
+        end = start + (count - 1) * hop + n_fft
+        needed = end - self._ola_start
+        if needed > len(self._ola):
+            self._ola = np.concatenate([self._ola, np.zeros(needed - len(self._ola), dtype=np.float32)])
+            self._wss = np.concatenate([self._wss, np.zeros(needed - len(self._wss), dtype=np.float32)])
+
+        offset = start - self._ola_start
+        ola = self._ola[offset:offset + (count + ratio - 1) * hop].reshape(-1, hop)
+        wss = self._wss[offset:offset + (count + ratio - 1) * hop].reshape(-1, hop)
+        win_sq = (self.window ** 2).reshape(ratio, hop)
+        blocks = frames.reshape(count, ratio, hop)
+        for k in range(ratio):
+            ola[k:k + count] += blocks[:, k]
+            wss[k:k + count] += win_sq[k]
+
+    def _emit(self, final):
+        if final:
+            # Longitud de la ISTFT sin ``length``: hop * (tramas - 1)
+            complete = self.n_fft // 2 + self.hop_length * max(self._frames_seen - 1, 0)
+        else:
+            complete = self._next_frame * self.hop_length
+        if complete <= self._emitted:
+            return np.zeros(0, dtype=np.float32)
+
+        lo = self._emitted - self._ola_start
+        hi = complete - self._ola_start
+        out = self._ola[lo:hi].copy()
+        wss = self._wss[lo:hi]
+        nonzero = wss > np.finfo(np.float32).tiny
+        out[nonzero] /= wss[nonzero]
+
+        self._emitted = complete
+        self._ola = self._ola[hi:]
+        self._wss = self._wss[hi:]
+        self._ola_start = complete
+        return out
+
+
+class _PeakMemory:
+    bytes = 0
+
+    @property
+    def mib(self):
+        return self.bytes / 2**20
+
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+@contextmanager
+def track_peak_memory():
+    """
+    Mide el pico de memoria reservada (numpy incluido) dentro del bloque.
 
-    except Exception as e:
-        print(f"Error durante la reducción de ruido: {e}")
-        raise  # Re-lanza la excepción para que se propague
-        return None
+    Si varias mediciones se solapan en el mismo proceso comparten el pico.
+    """
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            tracemalloc.start()
+        _tracemalloc_users += 1
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    result = _PeakMemory()
+    try:
+        yield result
+    finally:
+        with _tracemalloc_lock:
+            result.bytes = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0:
+                tracemalloc.stop()
 
 
-def split_audio(file_path, output_dir, segment_length_min=15, overlap_sec=30, base_name=None):
+def split_audio(file_path, output_dir, segment_length_min=15, overlap_sec=30, base_name=None,
+                virtual=False, manifest_dir=None, segment_mode="fixed"):
     """
     Divide un archivo de audio en segmentos con un traslape especificado y guarda los segmentos en una carpeta.
 
@@ -188,37 +497,256 @@ def split_audio(file_path, output_dir, segment_length_min=15, overlap_sec=30, ba
         segment_length_minutes (int, optional): La duración de cada segmento en minutos. Por defecto, 15 minutos.
         overlap_seconds (int, optional): La duración del traslape entre segmentos en segundos. Por defecto, 30 segundos.
         output_dir (str, optional): El nombre de la carpeta donde se guardarán los segmentos. Por defecto, "segment".
+        virtual (bool, optional): Si es True no se exporta ningún archivo: se escribe un manifiesto
+                                  con los rangos de tramas de cada segmento dentro de ``file_path``.
+        manifest_dir (str, optional): Carpeta del manifiesto. Por defecto, la carpeta de ``file_path``.
+        segment_mode (str, optional): "fixed" corta cada ``segment_length_min`` minutos con traslape;
+                                      "silence" corta en la pausa más cercana a cada límite, sin traslape.
 
     Returns:
         list: Una lista de objetos AudioSegment, donde cada objeto representa un segmento del audio original.
+              Con ``virtual`` devuelve la lista de rangos (inicio, fin) en tramas.
     """
 
     try:
-        audio = AudioSegment.from_file(file_path)
-        segment_length_ms = segment_length_min * 60 * 1000
-        overlap_ms = overlap_sec * 1000
-        step_ms = segment_length_ms - overlap_ms
+        info = sf.info(file_path)
 
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        def read_window(start, stop):
+            return sf.read(file_path, start=start, stop=stop, dtype="float32", always_2d=True)[0].mean(axis=1)
+
+        ranges = compute_segment_ranges(segment_mode, info.frames, info.samplerate,
+                                        segment_length_min, overlap_sec, read_window)
+        manifest_dir = manifest_dir or os.path.dirname(file_path)
+        if virtual:
+            write_manifest(manifest_dir, file_path, info.samplerate, info.frames, ranges)
+            return ranges
+
+        audio = AudioSegment.from_file(file_path)
+        os.makedirs(output_dir, exist_ok=True)
 
         segments = []
-        start = 0
-        segment_num = 1
-        while start < len(audio):
-            end = start + segment_length_ms
-            segment = audio[start:end]
+        for segment_num, (start, end) in enumerate(ranges, start=1):
             output_path = os.path.join(output_dir, f"{base_name}_segment_{segment_num}.wav")
-            segment.export(output_path, format="wav")
+            audio[start * 1000 // info.samplerate:end * 1000 // info.samplerate].export(output_path, format="wav")
             segments.append(output_path)
-            start += step_ms
-            segment_num += 1
 
+        write_manifest(manifest_dir, None, info.samplerate, info.frames, ranges, files=segments)
         print(f"Audio split into {len(segments)} segments in {output_dir}")
         return segments
     except Exception as e:
         print(f"Error splitting audio: {e}")
 
+"""# Pipeline en memoria
+
+Decodifica el audio una sola vez a un buffer float32 y aplica remuestreo,
+ganancia, reducción de ruido y segmentación sobre ese buffer. Solo se escriben
+los segmentos finales (y los intermedios cuando se pide depuración).
+"""
+
+def load_audio(audio_path, target_sr=16000, resampler=None):
+    """
+    Decodifica un archivo de audio una sola vez a un buffer mono float32
+    remuestreado a ``target_sr`` (por bloques, ver ``resampler.py``).
+
+    Returns:
+        tuple: (np.ndarray float32 en [-1, 1], tasa de muestreo)
+    """
+    sr, channels, blocks = read_audio_blocks(audio_path)
+    print(f"Archivo original: Canales: {channels}, Tasa: {sr}Hz")
+    if sr != target_sr:
+        blocks = resample_blocks(blocks, sr, target_sr, resampler)
+
+    start = time.perf_counter()
+    y = np.concatenate(list(blocks) or [np.zeros(0, dtype=np.float32)]).astype(np.float32, copy=False)
+    elapsed = time.perf_counter() - start
+    print(f"Audio cargado: {len(y)/target_sr:.2f}s a {target_sr}Hz en {elapsed:.2f}s "
+          f"(RTF {elapsed / max(len(y) / target_sr, 1e-9):.4f})")
+    return y, target_sr
+
+
+def apply_gain(y, gain_db):
+    """Aplica una ganancia en dB y recorta a [-1, 1] como lo haría un WAV de 16 bits."""
+    y *= np.float32(10 ** (gain_db / 20))
+    np.clip(y, -1.0, 1.0, out=y)
+    return y
+
+
+def compute_segment_ranges(segment_mode, total_frames, sr, segment_length_min, overlap_sec, read_window):
+    """
+    Rangos (inicio, fin) en tramas de cada segmento.
+
+    ``segment_mode`` "fixed" usa límites fijos con traslape; "silence" busca con
+    un VAD de energía la pausa más cercana a cada límite (``read_window(inicio, fin)``
+    devuelve las muestras de ese rango) y corta ahí sin traslape.
+    """
+    if segment_mode == "silence":
+        return silence_ranges(read_window, total_frames, sr, segment_length_min, overlap_sec)
+    if segment_mode == "fixed":
+        return segment_ranges(total_frames, sr, segment_length_min, overlap_sec)
+    raise ValueError(f"Unknown segment mode: {segment_mode}")
+
+
+def split_array(y, sr, output_dir, segment_length_min=15, overlap_sec=30, base_name=None,
+                segment_mode="fixed", manifest_dir=None):
+    """
+    Escribe los segmentos de un buffer en memoria como WAV de 16 bits, y el
+    manifiesto de segmentos en ``manifest_dir`` (por defecto la carpeta padre
+    de ``output_dir``).
+
+    Returns:
+        list: Las rutas de los segmentos escritos.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    ranges = compute_segment_ranges(segment_mode, len(y), sr, segment_length_min, overlap_sec,
+                                    lambda start, stop: y[start:stop])
+    segments = []
+    for segment_num, (start, end) in enumerate(ranges, start=1):
+        output_path = os.path.join(output_dir, f"{base_name}_segment_{segment_num}.wav")
+        sf.write(output_path, y[start:end], sr, subtype="PCM_16")
+        segments.append(output_path)
+
+    write_manifest(manifest_dir or os.path.dirname(os.path.abspath(output_dir)), None, sr, len(y), ranges,
+                   files=segments)
+
+    print(f"Audio split into {len(segments)} segments in {output_dir}")
+    return segments
+
+
+def process_audio_in_memory(input_file, output_dir, target_sr=16000, gain_db=5,
+                            segment_min=15, overlap_sec=30,
+                            do_noise_reduction=True, do_segmentation=True,
+                            debug=False, progress_callback=None, virtual_segments=True,
+                            segment_mode="silence", resampler=None):
+    """
+    Igual que ``process_audio`` pero con una sola decodificación y sin
+    archivos intermedios (salvo que ``debug`` sea True).
+
+    Con ``virtual_segments`` se escribe un único WAV procesado y un manifiesto
+    de rangos en lugar de exportar cada segmento.
+    """
+    def report(stage, percent):
+        if progress_callback:
+            progress_callback(stage, percent)
+
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+
+        report("converting", 0)
+        y, sr = load_audio(input_file, target_sr, resampler)
+        if debug:
+            sf.write(os.path.join(output_dir, f"{base_name}_converted.wav"), y, sr, subtype="PCM_16")
+
+        report("volume", 20)
+        y = apply_gain(y, gain_db)
+        if debug:
+            sf.write(os.path.join(output_dir, f"{base_name}_volume.wav"), y, sr, subtype="PCM_16")
+
+        if do_noise_reduction:
+            report("noise_reduction", 35)
+            y = reduce_noise_array(y, sr)
+            if debug:
+                sf.write(os.path.join(output_dir, f"{base_name}_clean.wav"), y, sr, subtype="PCM_16")
+
+        if do_segmentation and not virtual_segments:
+            report("segmentation", 80)
+            if not split_array(y, sr, os.path.join(output_dir, "segments"), segment_min, overlap_sec, base_name,
+                               segment_mode=segment_mode, manifest_dir=output_dir):
+                return False
+        else:
+            # El resultado final es el audio procesado completo (ya escrito en modo depuración)
+            final_path = os.path.join(output_dir, f"{base_name}_clean.wav" if do_noise_reduction else f"{base_name}_volume.wav")
+            if not debug:
+                sf.write(final_path, y, sr, subtype="PCM_16")
+            if do_segmentation:
+                report("segmentation", 80)
+                write_manifest(output_dir, final_path, sr, len(y),
+                               compute_segment_ranges(segment_mode, len(y), sr, segment_min, overlap_sec,
+                                                      lambda start, stop: y[start:stop]))
+
+        report("done", 100)
+        return True
+
+    except Exception as e:
+        print(f"Error en el pipeline en memoria: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def process_audio_streaming(input_file, output_dir, target_sr=16000, gain_db=5,
+                            segment_min=15, overlap_sec=30, do_noise_reduction=True,
+                            progress_callback=None, segment_mode="silence", resampler=None,
+                            on_segment=None):
+    """
+    Pipeline por bloques: decodificación, remuestreo, ganancia, reducción de
+    ruido y segmentación avanzan juntas sobre cada bloque del audio, y cada
+    segmento se exporta (``segments/*.wav``) en cuanto se conoce su final.
+
+    ``on_segment(segment)`` recibe cada ``segments.Segment`` exportado, así que
+    la transcripción puede empezar mientras el resto del audio se sigue
+    limpiando. Los cortes son los mismos que los de ``process_audio``.
+    """
+    def report(stage, percent):
+        if progress_callback:
+            progress_callback(stage, percent)
+
+    try:
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        segments_dir = os.path.join(output_dir, "segments")
+        os.makedirs(segments_dir, exist_ok=True)
+
+        report("converting", 0)
+        sr, channels, blocks = read_audio_blocks(input_file)
+        print(f"Archivo original: Canales: {channels}, Tasa: {sr}Hz")
+        if sr != target_sr:
+            blocks = resample_blocks(blocks, sr, target_sr, resampler)
+        try:
+            expected_frames = sf.info(input_file).duration * target_sr
+        except Exception:
+            expected_frames = None
+
+        gate = StreamingSpectralGate(target_sr) if do_noise_reduction else None
+        segmenter = StreamingSegmenter(target_sr, segment_min, overlap_sec, segment_mode)
+        files, ranges = [], []
+
+        def export(cuts):
+            for start, end, samples in cuts:
+                path = os.path.join(segments_dir, f"{base_name}_segment_{len(files) + 1}.wav")
+                sf.write(path, samples, target_sr, subtype="PCM_16")
+                files.append(path)
+                ranges.append((start, end))
+                if on_segment:
+                    on_segment(exported_segment(len(files), path, start))
+
+        start = time.perf_counter()
+        reported = 0
+        for block in blocks:
+            block = apply_gain(np.array(block, dtype=np.float32), gain_db)
+            export(segmenter.push(gate.process(block) if gate else block))
+            if expected_frames:
+                percent = int(95 * min(segmenter.total_frames / expected_frames, 1))
+                if percent > reported:
+                    report("processing", percent)
+                    reported = percent
+        if gate:
+            export(segmenter.push(gate.flush()))
+        export(segmenter.finish())
+
+        write_manifest(output_dir, None, target_sr, segmenter.total_frames, ranges, files=files)
+        elapsed = time.perf_counter() - start
+        duration = segmenter.total_frames / target_sr
+        print(f"Pipeline por bloques: {len(files)} segmentos de {duration:.2f}s en {elapsed:.2f}s "
+              f"(RTF {elapsed / max(duration, 1e-9):.4f})")
+        report("done", 100)
+        return True
+
+    except Exception as e:
+        print(f"Error en el pipeline por bloques: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
 """# Reducción de Ruido
 
 [Remove Background Noise with Fourier Transform in Python
@@ -227,25 +755,79 @@ def split_audio(file_path, output_dir, segment_length_min=15, overlap_sec=30, ba
 
 def process_audio(input_file, output_dir, target_sr=16000, gain_db=5, 
                  segment_min=15, overlap_sec=30, 
-                 do_noise_reduction=True, do_segmentation=True):
-    """Main processing pipeline for audio files."""
+                 do_noise_reduction=True, do_segmentation=True,
+                 progress_callback=None, in_memory=True, debug=False,
+                 virtual_segments=True, segment_mode="silence", resampler=None,
+                 streaming=False, on_segment=None):
+    """
+    Main processing pipeline for audio files.
+
+    ``progress_callback(stage, percent)`` is called before each stage and
+    once more with ("done", 100) when the pipeline finishes.
+
+    With ``in_memory`` the audio is decoded once and only the final segments
+    are written (see ``process_audio_in_memory``); otherwise every stage
+    writes its own WAV file.
+
+    With ``virtual_segments`` segmentation only writes a manifest of frame
+    ranges into the processed WAV (see ``segments.py``) instead of exporting
+    every segment.
+
+    ``segment_mode`` "silence" cuts at the pause closest to every
+    ``segment_min`` boundary with no overlap; "fixed" keeps the fixed
+    boundaries with ``overlap_sec`` of overlap.
+
+    ``resampler`` picks the sample-rate converter ("auto", "polyphase" or
+    "soxr", see ``resampler.py``).
+
+    With ``streaming`` (and segmentation) all stages run block by block and
+    every segment is exported as soon as it is cut, then passed to
+    ``on_segment(segment)`` (see ``process_audio_streaming``).
+    """
+    if do_segmentation:
+        clear_segments(output_dir)
+
+    if streaming and do_segmentation:
+        return process_audio_streaming(
+            input_file, output_dir, target_sr=target_sr, gain_db=gain_db,
+            segment_min=segment_min, overlap_sec=overlap_sec,
+            do_noise_reduction=do_noise_reduction, progress_callback=progress_callback,
+            segment_mode=segment_mode, resampler=resampler, on_segment=on_segment
+        )
+
+    if in_memory:
+        return process_audio_in_memory(
+            input_file, output_dir, target_sr=target_sr, gain_db=gain_db,
+            segment_min=segment_min, overlap_sec=overlap_sec,
+            do_noise_reduction=do_noise_reduction, do_segmentation=do_segmentation,
+            debug=debug, progress_callback=progress_callback,
+            virtual_segments=virtual_segments, segment_mode=segment_mode,
+            resampler=resampler
+        )
+
+    def report(stage, percent):
+        if progress_callback:
+            progress_callback(stage, percent)
     
     # Create output directory structure
     os.makedirs(output_dir, exist_ok=True)
     base_name = os.path.splitext(os.path.basename(input_file))[0]
     
     # Step 1: Convert to WAV and resample
+    report("converting", 0)
     converted_path = os.path.join(output_dir, f"{base_name}_converted.wav")
-    if not convert_to_wav_and_resample(input_file, converted_path, target_sr):
+    if not convert_to_wav_and_resample(input_file, converted_path, target_sr, resampler=resampler):
         return False
     
     # Step 2: Increase volume
+    report("volume", 20)
     volume_path = os.path.join(output_dir, f"{base_name}_volume.wav")
     if not increase_volume_and_save(converted_path, volume_path, gain_db):
         return False
     
     # Step 3: Noise reduction
     if do_noise_reduction:
+        report("noise_reduction", 35)
         clean_path = os.path.join(output_dir, f"{base_name}_clean.wav")
         if not reduce_noise(volume_path, clean_path):
             return False
@@ -255,10 +837,14 @@ def process_audio(input_file, output_dir, target_sr=16000, gain_db=5,
     
     # Step 4: Segmentation
     if do_segmentation:
+        report("segmentation", 80)
         segments_dir = os.path.join(output_dir, "segments")
-        if not split_audio(processed_path, segments_dir, segment_min, overlap_sec, base_name):
+        if not split_audio(processed_path, segments_dir, segment_min, overlap_sec, base_name,
+                           virtual=virtual_segments, manifest_dir=output_dir,
+                           segment_mode=segment_mode):
             return False
     
+    report("done", 100)
     return True
 
 def main():
@@ -271,6 +857,12 @@ def main():
     parser.add_argument("--gain", type=int, default=5, help="Volume gain in dB [default: 5]")
     parser.add_argument("--no-noise-reduce", action="store_true", help="Skip noise reduction step")
     parser.add_argument("--no-segment", action="store_true", help="Skip segmentation step")
+    parser.add_argument("--per-stage-files", action="store_true", help="Decode and write a WAV file at every stage (legacy pipeline)")
+    parser.add_argument("--debug", action="store_true", help="Also write the intermediate WAV files of the in-memory pipeline")
+    parser.add_argument("--segment-mode", choices=["silence", "fixed"], default="silence", help="Cut segments at pauses (silence) or at fixed boundaries with overlap (fixed) [default: silence]")
+    parser.add_argument("--resampler", choices=["auto", "polyphase", "soxr"], default=None, help="Sample-rate converter [default: soxr if installed, else polyphase]")
+    parser.add_argument("--export-segments", action="store_true", help="Export every segment as its own WAV instead of writing a segment manifest")
+    parser.add_argument("--streaming", action="store_true", help="Process block by block, exporting each segment as soon as it is cut")
     
     args = parser.parse_args()
     
@@ -292,7 +884,13 @@ def main():
         segment_min=args.segment_min,
         overlap_sec=args.overlap_sec,
         do_noise_reduction=not args.no_noise_reduce,
-        do_segmentation=not args.no_segment
+        do_segmentation=not args.no_segment,
+        in_memory=not args.per_stage_files,
+        debug=args.debug,
+        virtual_segments=not args.export_segments,
+        segment_mode=args.segment_mode,
+        resampler=args.resampler,
+        streaming=args.streaming
     )
     
     if success:
@@ -0,0 +1,121 @@
+"""
+Chunked sample-rate conversion of float32 NumPy buffers.
+
+Two interchangeable backends with the same streaming interface
+(``process(chunk)`` returns the samples that are ready, ``flush()`` the rest):
+
+- ``polyphase``: scipy's ``resample_poly`` run block by block with enough
+  context on both sides that the output matches a single call over the whole
+  buffer.
+- ``soxr``: libsoxr (SoX "HQ" quality) through the optional ``soxr`` package.
+
+``RESAMPLER`` selects the backend; "auto" uses soxr when it is installed and
+polyphase otherwise. Memory stays proportional to the chunk size, whatever
+the length of the recording.
+"""
+
+import os
+from math import ceil, gcd
+from typing import Iterable, Optional
+
+import numpy as np
+from scipy.signal import resample_poly
+
+try:
+    import soxr
+except ImportError:  # optional dependency
+    soxr = None
+
+RESAMPLER = os.getenv("RESAMPLER", "auto")
+# Input frames per block, about 10 s of 48 kHz audio
+RESAMPLE_CHUNK_FRAMES = int(os.getenv("RESAMPLE_CHUNK_FRAMES", str(1 << 19)))
+
+
+class PolyphaseResampler:
+    """Streaming ``resample_poly`` with the same output as one call on the whole signal."""
+
+    name = "polyphase"
+
+    def __init__(self, orig_sr: int, target_sr: int, chunk_frames: int = RESAMPLE_CHUNK_FRAMES):
+        factor = gcd(orig_sr, target_sr)
+        self.up = target_sr // factor
+        self.down = orig_sr // factor
+        # resample_poly's default filter spans 10 * max(up, down) taps at the
+        # upsampled rate; keep that much input (rounded to whole ``down`` steps so
+        # every block starts on an output sample) on each side of a block
+        half_width = 10 * max(self.up, self.down) // self.up + 2
+        self.pad = self.down * ceil(half_width / self.down)
+        self.chunk = max(chunk_frames // self.down, 1) * self.down
+        # Zeros before the signal, as resample_poly pads it
+        self._buffer = np.zeros(self.pad, dtype=np.float32)
+        self._consumed = 0
+        self._emitted = 0
+
+    def _resample_block(self, block: np.ndarray, count: int) -> np.ndarray:
+        first = self.pad * self.up // self.down
+        out = resample_poly(block, self.up, self.down)
+        return out[first:first + count].astype(np.float32, copy=False)
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        self._buffer = np.concatenate([self._buffer, np.asarray(x, dtype=np.float32)])
+        outputs = []
+        while len(self._buffer) >= self.chunk + 2 * self.pad:
+            count = self.chunk * self.up // self.down
+            outputs.append(self._resample_block(self._buffer[:self.chunk + 2 * self.pad], count))
+            self._buffer = self._buffer[self.chunk:]
+            self._consumed += self.chunk
+            self._emitted += count
+        return np.concatenate(outputs) if outputs else np.zeros(0, dtype=np.float32)
+
+    def flush(self) -> np.ndarray:
+        remaining = len(self._buffer) - self.pad
+        total = ceil((self._consumed + remaining) * self.up / self.down)
+        block = np.concatenate([self._buffer, np.zeros(self.pad + self.down, dtype=np.float32)])
+        out = self._resample_block(block, total - self._emitted)
+        self._buffer = np.zeros(self.pad, dtype=np.float32)
+        self._consumed += remaining
+        self._emitted = total
+        return out
+
+
+class SoxrResampler:
+    """Streaming libsoxr resampler (requires the ``soxr`` package)."""
+
+    name = "soxr"
+
+    def __init__(self, orig_sr: int, target_sr: int, quality: str = "HQ"):
+        if soxr is None:
+            raise ImportError("soxr is not installed (pip install soxr)")
+        self._stream = soxr.ResampleStream(orig_sr, target_sr, 1, dtype="float32", quality=quality)
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        return self._stream.resample_chunk(np.asarray(x, dtype=np.float32), last=False)
+
+    def flush(self) -> np.ndarray:
+        return self._stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def get_resampler(orig_sr: int, target_sr: int, method: Optional[str] = None,
+                  chunk_frames: int = RESAMPLE_CHUNK_FRAMES):
+    """A streaming resampler for ``method`` ("auto", "polyphase" or "soxr")."""
+    method = method or RESAMPLER
+    if method == "auto":
+        method = "soxr" if soxr is not None else "polyphase"
+    if method == "soxr":
+        return SoxrResampler(orig_sr, target_sr)
+    if method == "polyphase":
+        return PolyphaseResampler(orig_sr, target_sr, chunk_frames)
+    raise ValueError(f"Unknown resampler: {method}")
+
+
+def resample_blocks(blocks: Iterable[np.ndarray], orig_sr: int, target_sr: int,
+                    method: Optional[str] = None, chunk_frames: int = RESAMPLE_CHUNK_FRAMES):
+    """Resample a stream of mono float32 blocks, yielding the converted blocks."""
+    resampler = get_resampler(orig_sr, target_sr, method, chunk_frames)
+    for block in blocks:
+        out = resampler.process(block)
+        if len(out):
+            yield out
+    out = resampler.flush()
+    if len(out):
+        yield out
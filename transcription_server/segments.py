@@ -0,0 +1,403 @@
+"""
+Segments of a processed recording.
+
+Instead of exporting every overlapping window as its own WAV, segmentation
+writes a manifest of ``(start_frame, end_frame)`` ranges into the single
+processed WAV. Readers seek straight to those ranges. When segments are
+exported as files (``segments/*.wav``) the manifest lists those files.
+
+The manifest also carries each segment's duration, size and checksum, so the
+API serves segment information without opening any audio.
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from vad import find_pause
+
+MANIFEST_NAME = "segments.json"
+MANIFEST_VERSION = 2
+HASH_CHUNK_FRAMES = 1 << 16
+
+_manifest_cache = {}
+_cache_lock = threading.Lock()
+
+
+@dataclass
+class Segment:
+    index: int
+    path: str  # WAV file holding the samples
+    start_frame: int  # first frame inside ``path``
+    end_frame: int  # one past the last frame inside ``path``
+    sample_rate: int
+    offset_frame: int  # position of ``start_frame`` in the processed recording
+    virtual: bool = True
+    size_bytes: Optional[int] = None
+    sha256: Optional[str] = None  # of the segment's PCM data
+
+    @property
+    def num_frames(self) -> int:
+        return self.end_frame - self.start_frame
+
+    @property
+    def duration_sec(self) -> float:
+        return self.num_frames / self.sample_rate
+
+    @property
+    def offset_sec(self) -> float:
+        return self.offset_frame / self.sample_rate
+
+    @property
+    def label(self) -> str:
+        """Stable name of the segment, used in API responses."""
+        if self.virtual:
+            return f"{self.path}#{self.start_frame}-{self.end_frame}"
+        return self.path
+
+
+def segment_ranges(total_frames: int, sample_rate: int, segment_min: float = 15,
+                   overlap_sec: float = 30) -> List[Tuple[int, int]]:
+    """Fixed-length ``(start, end)`` frame ranges with the given overlap."""
+    segment_len = int(segment_min * 60 * sample_rate)
+    step = segment_len - int(overlap_sec * sample_rate)
+    if segment_len <= 0 or step <= 0:
+        raise ValueError("segment length must be positive and longer than the overlap")
+    ranges = []
+    start = 0
+    while start < total_frames:
+        ranges.append((start, min(start + segment_len, total_frames)))
+        start += step
+    return ranges
+
+
+def silence_ranges(read_window: Callable[[int, int], np.ndarray], total_frames: int,
+                   sample_rate: int, segment_min: float = 15, overlap_sec: float = 30,
+                   search_sec: Optional[float] = None) -> List[Tuple[int, int]]:
+    """
+    ``(start, end)`` frame ranges cut at pauses near every target boundary.
+
+    ``read_window(start, stop)`` returns the mono float samples of that frame
+    range. Around each boundary (every ``segment_min`` minutes) it searches
+    ``search_sec`` seconds each way for a pause and cuts there with no
+    overlap. Boundaries without a pause fall back to a fixed cut with
+    ``overlap_sec`` of overlap.
+    """
+    segment_len = int(segment_min * 60 * sample_rate)
+    if segment_len <= 0:
+        raise ValueError("segment length must be positive")
+    if search_sec is None:
+        search_sec = min(30.0, segment_min * 60 / 4)
+    search = min(int(search_sec * sample_rate), segment_len // 2)
+    overlap = min(int(overlap_sec * sample_rate), segment_len // 2)
+
+    ranges = []
+    start = 0
+    while start < total_frames:
+        target = start + segment_len
+        if target + search >= total_frames:
+            ranges.append((start, total_frames))
+            break
+        lo, hi = target - search, target + search
+        cut = find_pause(read_window(lo, hi), sample_rate, target - lo)
+        if cut is None:
+            ranges.append((start, target))
+            start = target - overlap
+        else:
+            ranges.append((start, lo + cut))
+            start = lo + cut
+    return ranges
+
+
+class StreamingSegmenter:
+    """
+    Cuts a recording that arrives block by block into the same ranges as
+    ``silence_ranges`` (``segment_mode`` "silence") or ``segment_ranges``
+    ("fixed"), each as soon as its end is known.
+
+    Only the samples from the start of the current segment are buffered.
+    """
+
+    def __init__(self, sample_rate: int, segment_min: float = 15, overlap_sec: float = 30,
+                 segment_mode: str = "silence", search_sec: Optional[float] = None):
+        self.sample_rate = sample_rate
+        self.segment_mode = segment_mode
+        self.segment_len = int(segment_min * 60 * sample_rate)
+        if segment_mode == "fixed":
+            self.step = self.segment_len - int(overlap_sec * sample_rate)
+            if self.segment_len <= 0 or self.step <= 0:
+                raise ValueError("segment length must be positive and longer than the overlap")
+        elif segment_mode == "silence":
+            if self.segment_len <= 0:
+                raise ValueError("segment length must be positive")
+            if search_sec is None:
+                search_sec = min(30.0, segment_min * 60 / 4)
+            self.search = min(int(search_sec * sample_rate), self.segment_len // 2)
+            self.overlap = min(int(overlap_sec * sample_rate), self.segment_len // 2)
+        else:
+            raise ValueError(f"Unknown segment mode: {segment_mode}")
+        self.total_frames = 0
+        self._start = 0
+        self._chunks: List[np.ndarray] = []
+        self._base = 0  # frame of the first buffered sample
+
+    def push(self, y: np.ndarray) -> List[Tuple[int, int, np.ndarray]]:
+        """Add samples; returns the ``(start, end, samples)`` of the segments completed by them."""
+        if len(y):
+            self._chunks.append(np.asarray(y, dtype=np.float32))
+            self.total_frames += len(y)
+        return self._cut(final=False)
+
+    def finish(self) -> List[Tuple[int, int, np.ndarray]]:
+        """The recording ended: returns the remaining segments."""
+        return self._cut(final=True)
+
+    def _ready(self, final: bool) -> bool:
+        if self._start >= self.total_frames:
+            return False
+        if final:
+            return True
+        if self.segment_mode == "fixed":
+            return self._start + self.segment_len <= self.total_frames
+        return self._start + self.segment_len + self.search < self.total_frames
+
+    def _cut(self, final: bool) -> List[Tuple[int, int, np.ndarray]]:
+        if not self._ready(final):
+            return []
+        # Concatenated only when a cut is due, not on every block
+        buffer = np.concatenate(self._chunks) if len(self._chunks) > 1 else self._chunks[0]
+        ranges = []
+        while self._ready(final):
+            start, target = self._start, self._start + self.segment_len
+            if self.segment_mode == "fixed":
+                ranges.append((start, min(target, self.total_frames)))
+                self._start += self.step
+            elif target + self.search >= self.total_frames:
+                ranges.append((start, self.total_frames))
+                self._start = self.total_frames
+            else:
+                lo, hi = target - self.search, target + self.search
+                cut = find_pause(buffer[lo - self._base:hi - self._base], self.sample_rate, target - lo)
+                if cut is None:
+                    ranges.append((start, target))
+                    self._start = target - self.overlap
+                else:
+                    ranges.append((start, lo + cut))
+                    self._start = lo + cut
+        cuts = [(start, end, buffer[start - self._base:end - self._base].copy()) for start, end in ranges]
+        keep_from = min(self._start, self.total_frames)
+        buffer = buffer[keep_from - self._base:]
+        self._chunks = [buffer] if len(buffer) else []
+        self._base = keep_from
+        return cuts
+
+
+def _hash_frames(path: str, start_frame: int, end_frame: int) -> str:
+    digest = hashlib.sha256()
+    with wave.open(path, "rb") as wf:
+        wf.setpos(start_frame)
+        remaining = end_frame - start_frame
+        while remaining > 0:
+            data = wf.readframes(min(HASH_CHUNK_FRAMES, remaining))
+            if not data:
+                break
+            remaining -= len(data) // (wf.getsampwidth() * wf.getnchannels())
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def exported_segment(index: int, path: str, offset_frame: int) -> Segment:
+    """A segment exported as its own WAV file, with its size and PCM checksum."""
+    with wave.open(path, "rb") as wf:
+        frames = wf.getnframes()
+        sample_rate = wf.getframerate()
+    return Segment(index=index, path=path, start_frame=0, end_frame=frames, sample_rate=sample_rate,
+                   offset_frame=offset_frame, virtual=False, size_bytes=os.path.getsize(path),
+                   sha256=_hash_frames(path, 0, frames))
+
+
+def write_manifest(output_dir: str, source_path: Optional[str], sample_rate: int, total_frames: int,
+                   ranges: List[Tuple[int, int]], sample_width: int = 2,
+                   files: Optional[List[str]] = None, **extra) -> str:
+    """
+    Write the segment manifest into ``output_dir``.
+
+    Segments are the frame ``ranges`` of ``source_path``, or, when ``files``
+    is given, the exported segment files (``ranges`` then gives each file's
+    position in the processed recording). Durations, sizes and a SHA-256 of
+    the PCM data of every segment are computed here, once, so readers never
+    have to open the audio.
+    """
+    entries = []
+    for i, (start, end) in enumerate(ranges, start=1):
+        entry = {
+            "index": i,
+            "start_frame": int(start),
+            "end_frame": int(end),
+            "offset_frame": int(start),
+            "duration_sec": round((end - start) / sample_rate, 3),
+            "size_bytes": int(end - start) * sample_width,
+        }
+        if files:
+            seg_file = files[i - 1]
+            with wave.open(seg_file, "rb") as wf:
+                frames = wf.getnframes()
+            entry.update({
+                "path": os.path.relpath(seg_file, output_dir),
+                "start_frame": 0,
+                "end_frame": frames,
+                "duration_sec": round(frames / sample_rate, 3),
+                "size_bytes": os.path.getsize(seg_file),
+                "sha256": _hash_frames(seg_file, 0, frames),
+            })
+        else:
+            entry["sha256"] = _hash_frames(source_path, start, end)
+        entries.append(entry)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "source": os.path.relpath(source_path, output_dir) if source_path else None,
+        "sample_rate": sample_rate,
+        "sample_width": sample_width,
+        "total_frames": total_frames,
+        "duration_sec": round(total_frames / sample_rate, 3),
+        "segments": entries,
+        **extra,
+    }
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    print(f"Segment manifest with {len(ranges)} segments written to {manifest_path}")
+    return manifest_path
+
+
+def load_manifest(output_dir: str) -> Optional[dict]:
+    """
+    The segment manifest of ``output_dir`` (None if there is none).
+
+    Parsed manifests are cached in-process and reloaded only when the file
+    changes, so status polling never touches the audio files.
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        st = os.stat(manifest_path)
+    except FileNotFoundError:
+        with _cache_lock:
+            _manifest_cache.pop(manifest_path, None)
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _manifest_cache.get(manifest_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    with _cache_lock:
+        _manifest_cache[manifest_path] = (stamp, manifest)
+    return manifest
+
+
+def ensure_manifest(output_dir: str) -> Optional[dict]:
+    """
+    The manifest of ``output_dir``, written once from the exported segment
+    files for recordings processed before manifests existed.
+    """
+    manifest = load_manifest(output_dir)
+    if manifest is not None:
+        return manifest
+    segments_dir = os.path.join(output_dir, "segments")
+    if not os.path.isdir(segments_dir):
+        return None
+    files = [str(p) for p in sorted(Path(segments_dir).glob("*.wav"), key=_segment_number)]
+    if not files:
+        return None
+    ranges = []
+    sample_rate = None
+    for seg_file in files:
+        with wave.open(seg_file, "rb") as wf:
+            sample_rate = wf.getframerate()
+            sample_width = wf.getsampwidth()
+            # Position in the recording is unknown for these files
+            ranges.append((0, wf.getnframes()))
+    write_manifest(output_dir, None, sample_rate, sum(end for _, end in ranges), ranges,
+                   sample_width=sample_width, files=files, offsets_known=False)
+    return load_manifest(output_dir)
+
+
+def clear_segments(output_dir: str):
+    """Remove the manifest and exported segments left by a previous run."""
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    segments_dir = os.path.join(output_dir, "segments")
+    if os.path.isdir(segments_dir):
+        shutil.rmtree(segments_dir)
+
+
+def _segment_number(path: Path) -> int:
+    digits = path.stem.rsplit("_", 1)[-1]
+    return int(digits) if digits.isdigit() else 0
+
+
+def load_segments(output_dir: str) -> List[Segment]:
+    """Segments of a processed recording, in order (empty if not segmented)."""
+    manifest = ensure_manifest(output_dir)
+    if manifest is None:
+        return []
+    source = os.path.join(output_dir, manifest["source"]) if manifest.get("source") else None
+    segments = []
+    for seg in manifest["segments"]:
+        path = seg.get("path")
+        segments.append(Segment(
+            index=seg["index"],
+            path=os.path.join(output_dir, path) if path else source,
+            start_frame=seg["start_frame"],
+            end_frame=seg["end_frame"],
+            sample_rate=manifest["sample_rate"],
+            offset_frame=seg.get("offset_frame", seg["start_frame"]),
+            virtual=path is None,
+            size_bytes=seg.get("size_bytes", (seg["end_frame"] - seg["start_frame"]) * manifest.get("sample_width", 2)),
+            sha256=seg.get("sha256"),
+        ))
+    return segments
+
+
+def iter_segment_frames(segment: Segment, chunk_frames: int = 4000) -> Iterator[bytes]:
+    """Read the PCM bytes of ``segment`` in chunks of ``chunk_frames`` frames."""
+    with wave.open(segment.path, "rb") as wf:
+        wf.setpos(segment.start_frame)
+        remaining = segment.num_frames
+        while remaining > 0:
+            data = wf.readframes(min(chunk_frames, remaining))
+            if not data:
+                break
+            remaining -= len(data) // (wf.getsampwidth() * wf.getnchannels())
+            yield data
+
+
+def segment_wav_bytes(segment: Segment) -> bytes:
+    """The segment as a standalone in-memory WAV file."""
+    if not segment.virtual:
+        with open(segment.path, "rb") as f:
+            return f.read()
+    with wave.open(segment.path, "rb") as src:
+        params = src.getparams()
+        src.setpos(segment.start_frame)
+        data = src.readframes(segment.num_frames)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as dst:
+        dst.setnchannels(params.nchannels)
+        dst.setsampwidth(params.sampwidth)
+        dst.setframerate(params.framerate)
+        dst.writeframes(data)
+    return buffer.getvalue()
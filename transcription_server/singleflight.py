@@ -0,0 +1,92 @@
+"""
+At most one run of an expensive job per key.
+
+``SingleFlight`` deduplicates inside a process: a caller arriving while a
+job with the same key is running awaits that job's result instead of
+starting another. ``file_lock`` extends this across the uvicorn worker
+processes: the job holds an exclusive ``flock`` on a lock file, so a second
+worker waits for the first to finish and then finds its result (e.g. in the
+result cache) rather than redoing the work.
+"""
+
+import asyncio
+import fcntl
+import os
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """In-process deduplication of concurrent async jobs by key."""
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def active(self, key: Hashable) -> bool:
+        task = self._tasks.get(key)
+        return task is not None and not task.done()
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Result of ``factory()``, started only if no job with ``key`` is running.
+
+        The job is shielded: a caller that disconnects does not cancel it for
+        the callers still waiting on it.
+        """
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Retrieved here so an exception nobody awaited any more is not logged as lost
+            task.exception()
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock on ``path`` shared by all processes (blocks until acquired)."""
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+@contextmanager
+def try_file_lock(path: str):
+    """``file_lock`` that does not wait: yields False, holding nothing, if the lock is taken."""
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+@asynccontextmanager
+async def async_file_lock(path: str):
+    """``file_lock`` that waits for the lock in a worker thread instead of blocking the loop."""
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
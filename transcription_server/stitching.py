@@ -0,0 +1,77 @@
+"""
+Merging of overlapping segment transcripts by absolute word timestamps.
+
+Every word is stored as a compact ``[start_sec, end_sec, word]`` triple with
+times relative to the start of the processed recording. Where two segments
+overlap, each one keeps only the words whose midpoint falls on its side of
+the middle of the overlap, so the shared audio appears once in the transcript.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+from segments import Segment
+
+Word = List  # [start_sec, end_sec, word]
+
+
+def absolute_words(vosk_results: Sequence[dict], offset_sec: float) -> List[Word]:
+    """Word triples from Vosk ``Result()`` dicts, shifted by the segment offset."""
+    words = []
+    for result in vosk_results:
+        for w in result.get("result", []):
+            words.append([round(offset_sec + w["start"], 2), round(offset_sec + w["end"], 2), w["word"]])
+    return words
+
+
+def _cut_points(segments: Sequence[Segment]) -> List[Tuple[float, float]]:
+    """``(keep_from, keep_until)`` in seconds for every segment."""
+    bounds = []
+    for i, segment in enumerate(segments):
+        keep_from, keep_until = float("-inf"), float("inf")
+        if i > 0:
+            prev = segments[i - 1]
+            prev_end = prev.offset_sec + prev.duration_sec
+            if prev_end > segment.offset_sec:
+                keep_from = (segment.offset_sec + prev_end) / 2
+        if i + 1 < len(segments):
+            nxt = segments[i + 1]
+            end = segment.offset_sec + segment.duration_sec
+            if end > nxt.offset_sec:
+                keep_until = (nxt.offset_sec + end) / 2
+        bounds.append((keep_from, keep_until))
+    return bounds
+
+
+def has_absolute_offsets(segments: Sequence[Segment]) -> bool:
+    """False for exported segments whose position in the recording is unknown."""
+    return all(seg.offset_frame > 0 for seg in segments[1:])
+
+
+def stitch_words(segments: Sequence[Segment], segment_words: Sequence[List[Word]]) -> List[Word]:
+    """Merge the per-segment words into one list without the overlap duplicates."""
+    merged: List[Word] = []
+    for (keep_from, keep_until), words in zip(_cut_points(segments), segment_words):
+        for word in words:
+            middle = (word[0] + word[1]) / 2
+            if not keep_from <= middle < keep_until:
+                continue
+            # Same word recognized on both sides of the seam
+            if merged and merged[-1][2] == word[2] and word[0] < merged[-1][1]:
+                continue
+            merged.append(word)
+    return merged
+
+
+def stitch_transcript(segments: Sequence[Segment], texts: Sequence[str],
+                      segment_words: Optional[Sequence[List[Word]]]) -> Tuple[str, List[Word]]:
+    """
+    The complete transcript and its word timings.
+
+    Falls back to joining the segment texts when word timings
+    (``segment_words`` is None, e.g. Gemini fallback) or segment offsets
+    (legacy segment files) are not available.
+    """
+    if segment_words is not None and has_absolute_offsets(segments):
+        words = stitch_words(segments, segment_words)
+        return " ".join(w[2] for w in words), words
+    return " ".join(t for t in texts if t), []
@@ -0,0 +1,226 @@
+"""
+Retention of processed artifacts in ``output/{audio_id}``.
+
+After a processing run succeeds, every intermediate stage file is kept,
+re-encoded as FLAC (lossless, about half the size) or deleted, according to
+``STORAGE_POLICY``. Files the segment manifest points at (the processed WAV
+of virtual segments, or the exported segment WAVs) are what the recognizer
+reads, so they are always kept as they are.
+
+``Reaper`` runs in a background thread and removes whole output directories
+that have not been used for ``OUTPUT_TTL_HOURS``, then the least recently
+used ones until the output root fits in ``STORAGE_BUDGET_GB``. It runs in
+every server process, so a directory whose per-audio lock file is held (by
+a job or a transcription in any process) is skipped rather than removed.
+"""
+
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+import soundfile as sf
+
+from segments import load_manifest
+from singleflight import try_file_lock
+
+KEEP = "keep"
+FLAC = "flac"
+DELETE = "delete"
+
+# Stage name -> file suffix written by preprocessor.process_audio
+STAGE_SUFFIXES = {
+    "converted": "_converted.wav",
+    "volume": "_volume.wav",
+    "clean": "_clean.wav",
+}
+DEFAULT_POLICY = {"converted": DELETE, "volume": DELETE, "clean": FLAC}
+
+OUTPUT_TTL_HOURS = float(os.getenv("OUTPUT_TTL_HOURS", "0"))  # 0 disables the TTL
+STORAGE_BUDGET_GB = float(os.getenv("STORAGE_BUDGET_GB", "0"))  # 0 disables the budget
+REAPER_INTERVAL_SEC = float(os.getenv("REAPER_INTERVAL_SEC", "600"))
+FLAC_BLOCK_FRAMES = 1 << 16
+
+
+def parse_policy(text: Optional[str]) -> Dict[str, str]:
+    """``"converted=delete,clean=flac"`` on top of ``DEFAULT_POLICY``."""
+    policy = dict(DEFAULT_POLICY)
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        stage, _, action = item.partition("=")
+        stage, action = stage.strip(), action.strip().lower()
+        if stage not in STAGE_SUFFIXES or action not in (KEEP, FLAC, DELETE):
+            raise ValueError(f"Invalid storage policy entry: {item!r}")
+        policy[stage] = action
+    return policy
+
+
+STORAGE_POLICY = parse_policy(os.getenv("STORAGE_POLICY"))
+
+
+def referenced_paths(output_dir: str) -> Set[str]:
+    """Absolute paths of the audio files the segment manifest reads from."""
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        return set()
+    paths = set()
+    if manifest.get("source"):
+        paths.add(os.path.abspath(os.path.join(output_dir, manifest["source"])))
+    for entry in manifest["segments"]:
+        if entry.get("path"):
+            paths.add(os.path.abspath(os.path.join(output_dir, entry["path"])))
+    return paths
+
+
+def to_flac(wav_path: str) -> str:
+    """Re-encode ``wav_path`` as FLAC next to it and remove the WAV."""
+    flac_path = os.path.splitext(wav_path)[0] + ".flac"
+    info = sf.info(wav_path)
+    tmp_path = flac_path + ".tmp"
+    with sf.SoundFile(tmp_path, "w", samplerate=info.samplerate, channels=info.channels,
+                      subtype="PCM_16", format="FLAC") as out:
+        for block in sf.blocks(wav_path, blocksize=FLAC_BLOCK_FRAMES, dtype="int16", always_2d=True):
+            out.write(block)
+    os.replace(tmp_path, flac_path)
+    os.remove(wav_path)
+    return flac_path
+
+
+def apply_policy(output_dir: str, base_name: str, policy: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Apply ``policy`` to the stage files of ``output_dir``; returns what was done per stage."""
+    policy = policy or STORAGE_POLICY
+    keep = referenced_paths(output_dir)
+    done = {}
+    for stage, suffix in STAGE_SUFFIXES.items():
+        path = os.path.join(output_dir, f"{base_name}{suffix}")
+        action = policy.get(stage, KEEP)
+        if not os.path.exists(path) or action == KEEP or os.path.abspath(path) in keep:
+            continue
+        before = os.path.getsize(path)
+        if action == FLAC:
+            after = os.path.getsize(to_flac(path))
+        else:
+            os.remove(path)
+            after = 0
+        done[stage] = action
+        print(f"Storage policy: {stage} -> {action} ({before / 2**20:.1f} MiB -> {after / 2**20:.1f} MiB)")
+    return done
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def last_used(path: str) -> float:
+    """Newest mtime of ``path`` and the files directly inside it."""
+    newest = os.path.getmtime(path)
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                newest = max(newest, entry.stat().st_mtime)
+            except OSError:
+                pass
+    return newest
+
+
+def touch(path: str):
+    """Mark an output directory as used, so the reaper keeps it longer."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+class Reaper:
+    """Background thread enforcing a TTL and a disk budget on the output root."""
+
+    def __init__(self, root: str, ttl_sec: float = OUTPUT_TTL_HOURS * 3600,
+                 budget_bytes: float = STORAGE_BUDGET_GB * 2**30,
+                 interval_sec: float = REAPER_INTERVAL_SEC,
+                 is_busy: Optional[Callable[[str], bool]] = None,
+                 on_remove: Optional[Callable[[str], None]] = None,
+                 lock_path: Optional[Callable[[str], str]] = None):
+        self.root = root
+        self.ttl_sec = ttl_sec
+        self.budget_bytes = budget_bytes
+        self.interval_sec = interval_sec
+        self.is_busy = is_busy or (lambda audio_id: False)
+        self.on_remove = on_remove
+        self.lock_path = lock_path
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_sec > 0 or self.budget_bytes > 0
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="output-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Output reaper failed: {e}")
+            self._stop.wait(self.interval_sec)
+
+    def _remove(self, audio_id: str, reason: str) -> bool:
+        if self.lock_path is None:
+            self._rmtree(audio_id, reason)
+            return True
+        with try_file_lock(self.lock_path(audio_id)) as locked:
+            if not locked:
+                # Being processed or transcribed in another process
+                return False
+            self._rmtree(audio_id, reason)
+            return True
+
+    def _rmtree(self, audio_id: str, reason: str):
+        shutil.rmtree(os.path.join(self.root, audio_id), ignore_errors=True)
+        if self.on_remove is not None:
+            self.on_remove(audio_id)
+        print(f"Output reaper: removed {audio_id} ({reason})")
+
+    def run_once(self, now: Optional[float] = None) -> List[str]:
+        """One pass over the output root; returns the audio_ids whose outputs were removed."""
+        now = now if now is not None else time.time()
+        removed = []
+        candidates = []
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or self.is_busy(entry.name):
+                continue
+            used = last_used(entry.path)
+            if self.ttl_sec > 0 and now - used > self.ttl_sec and self._remove(entry.name, "expired"):
+                removed.append(entry.name)
+            else:
+                candidates.append((used, entry.name, dir_size(entry.path)))
+
+        if self.budget_bytes > 0:
+            total = sum(size for _, _, size in candidates)
+            # Least recently used first
+            for _, audio_id, size in sorted(candidates):
+                if total <= self.budget_bytes:
+                    break
+                if self._remove(audio_id, "over disk budget"):
+                    removed.append(audio_id)
+                    total -= size
+        return removed
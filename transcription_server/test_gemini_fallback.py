@@ -0,0 +1,116 @@
+"""
+Tests of the concurrent Gemini fallback against a local stub of
+``GenerativeModel.generate_content_async``.
+
+Run with: python -m pytest test_gemini_fallback.py
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import google.api_core.exceptions
+import pytest
+
+import gemini_fallback
+from gemini_fallback import TokenBucket, transcribe_segments_fallback
+from segments import Segment
+
+
+class StubModel:
+    """Fails ``failures[name]`` times per segment, then answers with its name."""
+
+    def __init__(self, failures=None, delay_sec=0.01):
+        self.failures = dict(failures or {})
+        self.delay_sec = delay_sec
+        self.calls = []  # (segment name, time.monotonic())
+        self.running = 0
+        self.max_running = 0
+
+    async def generate_content_async(self, parts):
+        name = parts[1]["data"].decode("utf-8")
+        self.calls.append((name, time.monotonic()))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay_sec)
+            if self.failures.get(name, 0) > 0:
+                self.failures[name] -= 1
+                raise google.api_core.exceptions.GoogleAPIError(f"stub failure for {name}")
+            return SimpleNamespace(text=f" texto de {name} ")
+        finally:
+            self.running -= 1
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(gemini_fallback, "GEMINI_BACKOFF_BASE_SEC", 0.001)
+
+
+def make_segments(tmp_path, count):
+    segments = []
+    for i in range(count):
+        path = tmp_path / f"seg{i}.wav"
+        path.write_bytes(f"seg{i}".encode("utf-8"))
+        segments.append(Segment(index=i, path=str(path), start_frame=0, end_frame=16000,
+                                sample_rate=16000, offset_frame=i * 16000, virtual=False))
+    return segments
+
+
+def unlimited_bucket():
+    return TokenBucket(rate=1000.0, capacity=1000.0)
+
+
+def test_results_in_order_after_retries(tmp_path):
+    segments = make_segments(tmp_path, 6)
+    # Later segments fail more often, so they finish out of order
+    model = StubModel(failures={f"seg{i}": i % 3 for i in range(6)})
+    finished = []
+
+    results = asyncio.run(transcribe_segments_fallback(
+        model, segments, concurrency=6, bucket=unlimited_bucket(), max_retries=3,
+        on_result=lambda index, result: finished.append(index)))
+
+    assert [r["text"] for r in results] == [f"texto de seg{i}" for i in range(6)]
+    assert all(r["error"] is None for r in results)
+    assert sorted(finished) == list(range(6))
+    assert len(model.calls) == 6 + sum(i % 3 for i in range(6))
+
+
+def test_exhausted_retries_do_not_abort_other_segments(tmp_path):
+    segments = make_segments(tmp_path, 4)
+    model = StubModel(failures={"seg2": 10})
+
+    results = asyncio.run(transcribe_segments_fallback(
+        model, segments, concurrency=4, bucket=unlimited_bucket(), max_retries=2))
+
+    assert results[2]["text"] == ""
+    assert "stub failure for seg2" in results[2]["error"]
+    assert [r["text"] for i, r in enumerate(results) if i != 2] == ["texto de seg0", "texto de seg1", "texto de seg3"]
+    # First attempt plus max_retries
+    assert sum(1 for name, _ in model.calls if name == "seg2") == 3
+
+
+def test_concurrency_is_capped(tmp_path):
+    segments = make_segments(tmp_path, 10)
+    model = StubModel(failures={"seg0": 1, "seg5": 2}, delay_sec=0.02)
+
+    asyncio.run(transcribe_segments_fallback(
+        model, segments, concurrency=3, bucket=unlimited_bucket(), max_retries=3))
+
+    assert model.max_running == 3
+
+
+def test_token_bucket_spaces_calls(tmp_path):
+    segments = make_segments(tmp_path, 5)
+    model = StubModel(delay_sec=0)
+    rate = 20.0
+
+    asyncio.run(transcribe_segments_fallback(
+        model, segments, concurrency=5, bucket=TokenBucket(rate=rate, capacity=1), max_retries=0))
+
+    times = sorted(t for _, t in model.calls)
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert len(gaps) == 4
+    # Allow for timer granularity
+    assert min(gaps) >= 0.9 / rate
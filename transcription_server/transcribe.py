@@ -2,8 +2,10 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import queue
 import sys
+import threading
+import time
+from collections import deque
 import sounddevice as sd
 import wave
 import os
@@ -16,8 +18,85 @@ from vosk import Model, KaldiRecognizer, SetLogLevel
 # Asegúrate que esta ruta sea correcta o pásala con --model-path
 DEFAULT_MODEL_PATH = r"vosk-model-small-es-0.42"
 TARGET_SAMPLERATE = 16000
+# Frames per microphone callback: smaller blocks reach the recognizer sooner
+MIC_BLOCKSIZE = 1600
+# Audio the recognizer may fall behind by before chunks are dropped
+MAX_LAG_SEC = 2.0
+PARTIAL_INTERVAL_SEC = 0.2
+STATS_INTERVAL_SEC = 10.0
 
-q = queue.Queue()
+
+class AudioRingBuffer:
+    """
+    Bounded buffer between the microphone callback and the recognizer loop.
+
+    A microphone cannot be slowed down, so when the recognizer falls behind
+    and ``max_chunks`` are waiting, audio is dropped: with "drop-oldest" the
+    oldest waiting chunk (captions skip ahead and stay live), with
+    "drop-newest" the incoming one (what is buffered is kept, later audio
+    is lost). Latency is therefore bounded by ``max_chunks`` chunks.
+    """
+
+    def __init__(self, max_chunks, policy="drop-oldest"):
+        if policy not in ("drop-oldest", "drop-newest"):
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.max_chunks = max(int(max_chunks), 1)
+        self.policy = policy
+        self.dropped_chunks = 0
+        self.max_depth = 0
+        self._chunks = deque()
+        self._cond = threading.Condition()
+
+    def put(self, data, captured_at):
+        """Called from the audio callback: never blocks for long."""
+        with self._cond:
+            if len(self._chunks) >= self.max_chunks:
+                self.dropped_chunks += 1
+                if self.policy == "drop-newest":
+                    return
+                self._chunks.popleft()
+            self._chunks.append((data, captured_at))
+            self.max_depth = max(self.max_depth, len(self._chunks))
+            self._cond.notify()
+
+    def get_all(self):
+        """Wait for audio and take every waiting chunk: ``[(data, captured_at), ...]``."""
+        with self._cond:
+            while not self._chunks:
+                self._cond.wait()
+            chunks = list(self._chunks)
+            self._chunks.clear()
+            return chunks
+
+    def depth(self):
+        with self._cond:
+            return len(self._chunks)
+
+
+class LiveStats:
+    """End-to-end latency (capture to printed text) and buffering of the mic loop."""
+
+    def __init__(self, window=500):
+        self.latencies = deque(maxlen=window)
+        self.batches = 0
+        self.max_batch = 0
+
+    def add_batch(self, chunks):
+        self.batches += 1
+        self.max_batch = max(self.max_batch, chunks)
+
+    def add_latency(self, seconds):
+        self.latencies.append(seconds)
+
+    def summary(self, ring, chunk_sec):
+        text = (f"cola {ring.depth()} (máx {ring.max_depth}, lote máx {self.max_batch}), "
+                f"descartados {ring.dropped_chunks} ({ring.dropped_chunks * chunk_sec:.1f}s)")
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+            text += (f", latencia media {sum(ordered) / len(ordered) * 1000:.0f} ms, "
+                     f"p95 {p95 * 1000:.0f} ms, máx {ordered[-1] * 1000:.0f} ms")
+        return text
 
 
 def int_or_str(text):
@@ -27,10 +106,12 @@ def int_or_str(text):
         return text
 
 
-def callback_mic(indata, frames, time, status):
-    if status:
-        sys.stderr.write(str(status) + '\n')
-    q.put(bytes(indata))
+def make_callback_mic(ring):
+    def callback_mic(indata, frames, time_info, status):
+        if status:
+            sys.stderr.write(str(status) + '\n')
+        ring.put(bytes(indata), time.monotonic())
+    return callback_mic
 
 
 def main():
@@ -64,7 +145,22 @@ def main():
         help=f"Sampling rate for microphone (default/target: {TARGET_SAMPLERATE} Hz).")
     parser.add_argument(
         "-raw", "--save-raw-audio", type=str, metavar="RAW_AUDIO_FILE",
-        help="Audio file to store raw microphone recording to (RAW int16 format)")
+        help="Audio file to store raw microphone recording to (RAW int16 format; dropped chunks are not included)")
+    parser.add_argument(
+        "--blocksize", type=int, default=MIC_BLOCKSIZE,
+        help=f"Frames per microphone block (default: {MIC_BLOCKSIZE})")
+    parser.add_argument(
+        "--max-lag-sec", type=float, default=MAX_LAG_SEC,
+        help=f"Audio allowed to wait for the recognizer before chunks are dropped (default: {MAX_LAG_SEC})")
+    parser.add_argument(
+        "--overflow", choices=["drop-oldest", "drop-newest"], default="drop-oldest",
+        help="What to drop when the recognizer falls behind (default: drop-oldest)")
+    parser.add_argument(
+        "--partial-interval", type=float, default=PARTIAL_INTERVAL_SEC,
+        help=f"Seconds between partial hypotheses, 0 to print only final segments (default: {PARTIAL_INTERVAL_SEC})")
+    parser.add_argument(
+        "--stats-interval", type=float, default=STATS_INTERVAL_SEC,
+        help=f"Seconds between queue/latency reports on stderr, 0 to disable (default: {STATS_INTERVAL_SEC})")
 
     args = parser.parse_args(remaining)
 
@@ -104,6 +200,8 @@ def main():
                 f"Error opening transcription file {args.transcription_file}: {e}", file=sys.stderr)
             transcription_file_writer = None
 
+    # Modo micrófono: se asignan al abrir el stream
+    ring = stats = chunk_sec = None
     try:
         if args.input_file:
             # --- Transcribir desde Archivo WAV (YA DEBE ESTAR EN FORMATO CORRECTO) ---
@@ -182,8 +280,12 @@ def main():
             print(
                 f"Usando tasa de muestreo para micrófono: {effective_mic_samplerate} Hz.")
 
-            with sd.RawInputStream(samplerate=effective_mic_samplerate, blocksize=8000, device=args.device,
-                                   dtype="int16", channels=1, callback=callback_mic):
+            chunk_sec = args.blocksize / effective_mic_samplerate
+            ring = AudioRingBuffer(max(round(args.max_lag_sec / chunk_sec), 1), args.overflow)
+            stats = LiveStats()
+
+            with sd.RawInputStream(samplerate=effective_mic_samplerate, blocksize=args.blocksize, device=args.device,
+                                   dtype="int16", channels=1, callback=make_callback_mic(ring)):
                 print("#" * 80)
                 print(
                     f"Escuchando... Presiona Ctrl+C para detener. (Modelo: {os.path.basename(args.model_path)})")
@@ -193,21 +295,44 @@ def main():
                 rec = KaldiRecognizer(model, effective_mic_samplerate)
                 rec.SetWords(True)
                 accumulated_text_mic = []
+                last_partial = ""
+                last_partial_at = 0.0
+                last_stats_at = time.monotonic()
                 while True:
-                    data = q.get()
+                    # Todo lo que esperaba en la cola va en una sola llamada al reconocedor
+                    chunks = ring.get_all()
+                    stats.add_batch(len(chunks))
+                    data = b"".join(chunk for chunk, _ in chunks)
+                    newest = chunks[-1][1]
                     if rec.AcceptWaveform(data):
                         result_json_str = rec.Result()
                         result_data = json.loads(result_json_str)
                         if "text" in result_data and result_data["text"]:
                             segment_text = result_data["text"]
+                            if last_partial:
+                                # Borrar la línea del parcial
+                                print("\r" + " " * (len(last_partial) + 9) + "\r", end="")
                             print(f"Segmento: {segment_text}")
+                            stats.add_latency(time.monotonic() - newest)
                             accumulated_text_mic.append(segment_text)
                             if transcription_file_writer:
                                 transcription_file_writer.write(
                                     segment_text + " ")
                                 transcription_file_writer.flush()
+                        last_partial = ""
+                    elif args.partial_interval > 0 and time.monotonic() - last_partial_at >= args.partial_interval:
+                        partial = json.loads(rec.PartialResult()).get("partial", "")
+                        if partial and partial != last_partial:
+                            padding = " " * max(len(last_partial) - len(partial), 0)
+                            print(f"\rParcial: {partial}{padding}", end="", flush=True)
+                            stats.add_latency(time.monotonic() - newest)
+                            last_partial = partial
+                        last_partial_at = time.monotonic()
                     if raw_audio_file_writer is not None:
                         raw_audio_file_writer.write(data)
+                    if args.stats_interval > 0 and time.monotonic() - last_stats_at >= args.stats_interval:
+                        print(f"[stats] {stats.summary(ring, chunk_sec)}", file=sys.stderr)
+                        last_stats_at = time.monotonic()
 
     except KeyboardInterrupt:
         print("\nGrabación/Transcripción detenida.")
@@ -218,6 +343,8 @@ def main():
             print(final_mic_text)
             if transcription_file_writer and not transcription_file_writer.closed:
                 transcription_file_writer.write("\n")
+        if stats is not None:
+            print(f"[stats] {stats.summary(ring, chunk_sec)}", file=sys.stderr)
         parser.exit(0)
     except Exception as e:
         sys.stderr.write(type(e).__name__ + ": " + str(e) + '\n')
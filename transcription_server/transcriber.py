@@ -0,0 +1,193 @@
+"""
+Vosk transcription of audio segments, in-process or across a pool of
+worker processes.
+
+Each worker process holds the shared Vosk model (inherited from the parent
+when the pool is forked, loaded once by the initializer otherwise) and builds
+its own ``KaldiRecognizer`` per segment, so segments of the same recording are
+recognized in parallel on every available core.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import wave
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional, Union
+
+import numpy as np
+from vosk import Model, KaldiRecognizer
+
+from model_registry import registry
+from segments import Segment, iter_segment_frames
+from stitching import absolute_words
+from vad import SILENCE_DB, SilenceGate
+
+# Server processes on the machine (uvicorn reads WEB_CONCURRENCY as its --workers default)
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+# Recognizer processes per server process; by default the cores are split among them
+TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "0")) or max((os.cpu_count() or 1) // WEB_CONCURRENCY, 1)
+# "fork" shares the already loaded model with the workers copy-on-write
+TRANSCRIBE_START_METHOD = os.getenv(
+    "TRANSCRIBE_START_METHOD",
+    "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+)
+# Frames per AcceptWaveform call (see benchmark.py for the chunk size sweep)
+RECOGNIZER_CHUNK_FRAMES = int(os.getenv("RECOGNIZER_CHUNK_FRAMES", "4000"))
+# Silences longer than this are not fed to the recognizer (0 feeds everything)
+RECOGNIZER_SKIP_SILENCE_SEC = float(os.getenv("RECOGNIZER_SKIP_SILENCE_SEC", "0.5"))
+RECOGNIZER_SILENCE_DB = float(os.getenv("RECOGNIZER_SILENCE_DB", str(SILENCE_DB)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_model_path: Optional[str] = None
+_pool_lock = threading.Lock()
+_worker_model_path: Optional[str] = None
+
+
+def _as_segment(segment: Union[Segment, str]) -> Segment:
+    if isinstance(segment, Segment):
+        return segment
+    with wave.open(segment, 'rb') as wf:
+        return Segment(index=0, path=segment, start_frame=0, end_frame=wf.getnframes(),
+                       sample_rate=wf.getframerate(), offset_frame=0, virtual=False)
+
+
+def recognize_segment(model: Model, segment: Union[Segment, str],
+                      chunk_frames: int = RECOGNIZER_CHUNK_FRAMES,
+                      skip_silence_sec: float = RECOGNIZER_SKIP_SILENCE_SEC) -> dict:
+    """
+    Recognize a single audio segment (a frame range or a whole WAV file) using Vosk.
+
+    The audio is fed to the recognizer ``chunk_frames`` frames at a time.
+    Once a silence has lasted ``skip_silence_sec``, its remaining chunks are
+    dropped (dead air costs no decoding) and the word times are shifted back
+    to where the words are in the recording.
+
+    Returns ``{"text": str, "words": [[start_sec, end_sec, word], ...]}`` with
+    word times relative to the start of the processed recording.
+    """
+    segment_path = segment.label if isinstance(segment, Segment) else segment
+    try:
+        segment = _as_segment(segment)
+        with wave.open(segment.path, 'rb') as wf:
+            # Verify audio format
+            if wf.getnchannels() != 1:
+                raise ValueError("Audio must be mono")
+            if wf.getsampwidth() != 2:
+                raise ValueError("Audio must be 16-bit")
+
+        rec = KaldiRecognizer(model, segment.sample_rate)
+        rec.SetWords(True)
+
+        results = []
+        gate = SilenceGate(segment.sample_rate, skip_silence_sec, RECOGNIZER_SILENCE_DB) if skip_silence_sec > 0 else None
+
+        for data in iter_segment_frames(segment, chunk_frames):
+            if gate is not None and not gate.accept(np.frombuffer(data, dtype=np.int16) / np.float32(32768)):
+                continue
+            if rec.AcceptWaveform(data):
+                results.append(json.loads(rec.Result()))
+
+        # Get final result
+        results.append(json.loads(rec.FinalResult()))
+
+        if gate is not None and gate.skipped_frames:
+            for r in results:
+                for w in r.get("result", []):
+                    w["start"] = gate.original_time(w["start"])
+                    w["end"] = gate.original_time(w["end"])
+
+        return {
+            "text": " ".join(r["text"] for r in results if r.get("text")).strip(),
+            "words": absolute_words(results, segment.offset_sec)
+        }
+
+    except Exception as e:
+        raise ValueError(f"Error transcribing {segment_path}: {str(e)}")
+
+
+def _init_worker(model_path: str):
+    global _worker_model_path
+    _worker_model_path = model_path
+    # No-op when the model was inherited from the parent through fork
+    registry.get(model_path)
+
+
+def _recognize_in_worker(segment: Union[Segment, str]) -> dict:
+    return recognize_segment(registry.get(_worker_model_path), segment)
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def get_pool(model_path: str) -> ProcessPoolExecutor:
+    """
+    Return the recognizer pool for ``model_path``, creating it on first use.
+
+    ``ProcessPoolExecutor`` only starts its processes on the first submit, so
+    a new pool is warmed up with one no-op per worker: the forks happen here
+    (at startup, from the main thread) rather than in the middle of a request.
+    """
+    global _pool, _pool_model_path
+    with _pool_lock:
+        if _pool is not None and _pool_model_path != model_path:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            if TRANSCRIBE_START_METHOD == "fork":
+                # Load before forking so every worker shares the parent's copy
+                registry.get(model_path)
+            _pool = ProcessPoolExecutor(
+                max_workers=TRANSCRIBE_WORKERS,
+                mp_context=multiprocessing.get_context(TRANSCRIBE_START_METHOD),
+                initializer=_init_worker,
+                initargs=(model_path,)
+            )
+            _pool_model_path = model_path
+            for future in [_pool.submit(_worker_ready) for _ in range(TRANSCRIBE_WORKERS)]:
+                future.result()
+        return _pool
+
+
+def submit_segment(model_path: str, segment: Union[Segment, str]) -> Future:
+    """Recognize one segment on the recognizer pool (result as for ``recognize_segment``)."""
+    return get_pool(model_path).submit(_recognize_in_worker, segment)
+
+
+def shutdown_pool():
+    global _pool, _pool_model_path
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_model_path = None
+
+
+async def transcribe_segments(model_path: str, segments: List[Union[Segment, str]],
+                              on_result: Optional[Callable[[int, dict], None]] = None) -> List[dict]:
+    """
+    Recognize ``segments`` in parallel on the recognizer pool.
+
+    Results (see ``recognize_segment``) are returned in the same order as
+    ``segments``. ``on_result(index, result)`` is called as soon as each
+    segment finishes, so callers can checkpoint it before the rest are done.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pool(model_path)
+
+    async def run(index: int, segment) -> dict:
+        result = await loop.run_in_executor(pool, _recognize_in_worker, segment)
+        if on_result is not None:
+            on_result(index, result)
+        return result
+
+    try:
+        return await asyncio.gather(*[run(i, segment) for i, segment in enumerate(segments)])
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM); drop the pool so the next request gets a fresh one
+        shutdown_pool()
+        raise
@@ -0,0 +1,158 @@
+"""
+Transcription result cache.
+
+Complete transcripts are keyed by (content hash of the upload, preprocessing
+parameters, engine, model version) and single segments by (SHA-256 of the
+segment PCM, engine, model version), so changing a setting only recomputes
+the segments whose audio actually changed. Entries are JSON files in one
+directory; the least recently used ones are evicted once the directory grows
+past ``max_bytes``.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+TRANSCRIPT_CACHE_MAX_MB = float(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "256"))
+PARAMS_NAME = "params.json"
+
+# AudioProcessingRequest fields that change the audio that reaches the recognizer
+PREPROCESSING_KEYS = ("target_sr", "gain_db", "segment_min", "overlap_sec",
+                      "do_noise_reduction", "do_segmentation", "segment_mode")
+
+
+def cache_key(*parts) -> str:
+    """Stable hex key for any JSON-serializable ``parts``."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def preprocessing_params(params: Optional[dict]) -> Optional[dict]:
+    if params is None:
+        return None
+    return {k: params.get(k) for k in PREPROCESSING_KEYS}
+
+
+def write_params(output_dir: str, params: dict):
+    """Record the parameters that produced the contents of ``output_dir``."""
+    path = os.path.join(output_dir, PARAMS_NAME)
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(params, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_params(output_dir: str) -> Optional[dict]:
+    """Parameters of the last successful processing of ``output_dir`` (None if unknown)."""
+    try:
+        with open(os.path.join(output_dir, PARAMS_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def segment_entry(words: Optional[List[list]], text: str, offset_sec: float) -> dict:
+    """Cache value for one segment, word times relative to the segment start."""
+    relative = None
+    if words is not None:
+        relative = [[round(w[0] - offset_sec, 2), round(w[1] - offset_sec, 2), w[2]] for w in words]
+    return {"text": text, "words": relative}
+
+
+def segment_result(entry: dict, offset_sec: float) -> dict:
+    """Inverse of ``segment_entry`` for a segment starting at ``offset_sec``."""
+    words = entry.get("words")
+    if words is not None:
+        words = [[round(w[0] + offset_sec, 2), round(w[1] + offset_sec, 2), w[2]] for w in words]
+    return {"text": entry["text"], "words": words, "error": None}
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of JSON documents stored as ``<key>.json`` files.
+
+    Every uvicorn worker has its own instance on the same directory, so the
+    directory is the source of truth: a key another worker wrote is picked up
+    from disk on ``get``. The running total only counts what this process
+    has seen; once it goes over ``max_bytes`` the directory is rescanned
+    (file mtimes carry the recency), so eviction works on every worker's
+    entries.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = int(TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _scan(self):
+        """Rebuild the entry list from the directory, oldest first."""
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    # Evicted meanwhile by another worker
+                    continue
+                entries.append((st.st_mtime, entry.name[:-len(".json")], st.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.total_bytes = sum(self._entries.values())
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            path = self._path(key)
+            if key not in self._entries:
+                # Possibly written by another worker process
+                try:
+                    size = os.stat(path).st_size
+                except OSError:
+                    return None
+                self._entries[key] = size
+                self.total_bytes += size
+            try:
+                with open(path) as f:
+                    value = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: dict):
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            path = self._path(key)
+            # Unique per process: every uvicorn worker writes into the same directory
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self.total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            if self.total_bytes > self.max_bytes:
+                # The other workers' writes count against the same budget
+                self._scan()
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                if oldest == key:
+                    self._entries.move_to_end(key)
+                    continue
+                self._drop(oldest)
+
+    def _drop(self, key: str):
+        self.total_bytes -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
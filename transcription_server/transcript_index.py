@@ -0,0 +1,102 @@
+"""
+Columnar word index of a transcript, for time-range and word-offset queries.
+
+The stitched word timings are stored as parallel arrays in an ``.npz`` file:
+``starts`` and ``ends`` (float32 seconds), ``word_ids`` (int32) and the
+``vocab`` the ids point into. Words are in time order, so a time range maps
+to an index range with two binary searches and a slice of the arrays.
+
+Loaded indexes are cached in-process and reloaded only when the file changes.
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INDEX_SUFFIX = ".words.npz"
+
+_index_cache = {}
+_cache_lock = threading.Lock()
+
+
+def index_path(transcriptions_dir: str, audio_id: str) -> str:
+    return os.path.join(transcriptions_dir, f"{audio_id}{INDEX_SUFFIX}")
+
+
+@dataclass
+class TranscriptIndex:
+    starts: np.ndarray
+    ends: np.ndarray
+    word_ids: np.ndarray
+    vocab: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.word_ids)
+
+    @property
+    def duration_sec(self) -> float:
+        return float(self.ends[-1]) if len(self.ends) else 0.0
+
+    def time_range(self, start_sec: float, end_sec: float) -> Tuple[int, int]:
+        """``(first, stop)`` indices of the words that overlap ``[start_sec, end_sec)``."""
+        first = int(np.searchsorted(self.ends, start_sec, side="right"))
+        stop = int(np.searchsorted(self.starts, end_sec, side="left"))
+        return first, max(first, stop)
+
+    def words(self, first: int, stop: int) -> List[list]:
+        """``[start_sec, end_sec, word]`` triples of the words ``first:stop``."""
+        words = self.vocab[self.word_ids[first:stop]].tolist()
+        starts = np.round(self.starts[first:stop].astype(np.float64), 2).tolist()
+        ends = np.round(self.ends[first:stop].astype(np.float64), 2).tolist()
+        return [[s, e, w] for s, e, w in zip(starts, ends, words)]
+
+    def text(self, first: int, stop: int) -> str:
+        return " ".join(self.vocab[self.word_ids[first:stop]].tolist())
+
+
+def build_index(words: Sequence[Sequence]) -> TranscriptIndex:
+    """Columnar index of ``[start_sec, end_sec, word]`` triples (sorted by start time)."""
+    words = sorted(words, key=lambda w: w[0])
+    vocab, word_ids = np.unique(np.array([w[2] for w in words], dtype=str), return_inverse=True)
+    return TranscriptIndex(
+        starts=np.array([w[0] for w in words], dtype=np.float32),
+        ends=np.array([w[1] for w in words], dtype=np.float32),
+        word_ids=word_ids.astype(np.int32),
+        vocab=vocab,
+    )
+
+
+def write_index(path: str, words: Sequence[Sequence]) -> TranscriptIndex:
+    """Build the index of ``words`` and store it atomically at ``path``."""
+    index = build_index(words)
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp.npz"
+    np.savez(tmp_path, starts=index.starts, ends=index.ends, word_ids=index.word_ids, vocab=index.vocab)
+    os.replace(tmp_path, path)
+    return index
+
+
+def load_index(path: str) -> Optional[TranscriptIndex]:
+    """The index stored at ``path`` (None if there is none)."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        with _cache_lock:
+            _index_cache.pop(path, None)
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _index_cache.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with np.load(path, allow_pickle=False) as data:
+        index = TranscriptIndex(
+            starts=data["starts"],
+            ends=data["ends"],
+            word_ids=data["word_ids"],
+            vocab=data["vocab"],
+        )
+    with _cache_lock:
+        _index_cache[path] = (stamp, index)
+    return index
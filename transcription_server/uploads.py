@@ -0,0 +1,158 @@
+"""
+Ingestion and content hashing of uploaded audio.
+
+Uploads are read in chunks and written to disk from a worker thread, so the
+event loop stays free and memory stays at one chunk per upload however large
+the file is. The SHA-256 and the size are computed in the same pass and the
+upload is aborted as soon as it goes over ``MAX_UPLOAD_MB``.
+
+The hash is stored in the audio registry (``audio_registry.py``), so when
+the same recording is uploaded again the existing audio_id (with its
+processed artifacts and cached transcript) is reused instead of storing and
+processing a copy.
+
+``StreamingDecoder`` optionally pipes the chunks into ffmpeg while they
+arrive, so a 16 kHz mono WAV is ready for processing when the upload ends.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+
+COPY_CHUNK_SIZE = 1 << 20
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "1024"))  # 0 disables the limit
+DECODE_SAMPLE_RATE = 16000
+
+
+class UploadTooLargeError(Exception):
+    """The upload went over the size limit (its partial file is removed)."""
+
+
+def max_upload_bytes() -> Optional[int]:
+    return int(MAX_UPLOAD_MB * 2**20) if MAX_UPLOAD_MB > 0 else None
+
+
+async def upload_chunks(upload, chunk_size: int = COPY_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Chunks of a FastAPI ``UploadFile``."""
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _hash_and_write(digest, dst, chunk: bytes):
+    # hashlib releases the GIL on large buffers, so both run off the loop
+    digest.update(chunk)
+    dst.write(chunk)
+
+
+async def save_upload(chunks: AsyncIterator[bytes], dst_path: str, max_bytes: Optional[int] = None,
+                      on_chunk: Optional[Callable[[bytes], Awaitable[None]]] = None) -> Tuple[str, int]:
+    """
+    Write ``chunks`` to ``dst_path`` and return (sha256 hex digest, size) in
+    one pass. Raises ``UploadTooLargeError`` past ``max_bytes``; on any error
+    the partial file is removed.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    dst = await asyncio.to_thread(open, dst_path, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadTooLargeError(f"Upload is larger than {max_bytes / 2**20:.0f} MiB")
+            await asyncio.to_thread(_hash_and_write, digest, dst, chunk)
+            if on_chunk is not None:
+                await on_chunk(chunk)
+    except BaseException:
+        dst.close()
+        os.remove(dst_path)
+        raise
+    await asyncio.to_thread(dst.close)
+    return digest.hexdigest(), size
+
+
+def hash_file(path: str, chunk_size: int = COPY_CHUNK_SIZE) -> str:
+    """SHA-256 hex digest of a file already on disk."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StreamingDecoder:
+    """
+    ffmpeg decoding an upload to 16-bit mono WAV while its bytes arrive.
+
+    Decoding is best effort: containers that cannot be read from a pipe
+    (e.g. MP4/M4A with the index at the end) just fail, and the upload is
+    then decoded from disk by the normal processing run.
+    """
+
+    def __init__(self, output_path: str, sample_rate: int = DECODE_SAMPLE_RATE):
+        self.output_path = output_path
+        self.sample_rate = sample_rate
+        self._tmp_path = output_path + ".part.wav"
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._stderr: Optional[asyncio.Task] = None
+        self._failed = False
+
+    @staticmethod
+    def available() -> bool:
+        return shutil.which("ffmpeg") is not None
+
+    async def start(self):
+        os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+        self._proc = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-i", "pipe:0", "-ac", "1", "-ar", str(self.sample_rate), "-c:a", "pcm_s16le",
+            self._tmp_path,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        # Drained concurrently so a chatty ffmpeg never blocks on a full pipe
+        self._stderr = asyncio.ensure_future(self._proc.stderr.read())
+
+    async def feed(self, chunk: bytes):
+        if self._proc is None or self._failed:
+            return
+        try:
+            self._proc.stdin.write(chunk)
+            await self._proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg gave up on this input; the upload itself carries on
+            self._failed = True
+
+    async def finish(self) -> Optional[str]:
+        """Wait for ffmpeg; the WAV path, or None if decoding failed."""
+        if self._proc is None:
+            return None
+        try:
+            self._proc.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        stderr = await self._stderr
+        returncode = await self._proc.wait()
+        if returncode != 0 or self._failed:
+            print(f"Streaming decode failed ({returncode}): {stderr.decode(errors='replace').strip()[-300:]}")
+            self._remove_tmp()
+            return None
+        os.replace(self._tmp_path, self.output_path)
+        return self.output_path
+
+    async def abort(self):
+        if self._proc is not None and self._proc.returncode is None:
+            self._proc.kill()
+            await self._proc.wait()
+        if self._stderr is not None:
+            await self._stderr
+        self._remove_tmp()
+
+    def _remove_tmp(self):
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
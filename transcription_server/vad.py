@@ -0,0 +1,151 @@
+"""
+Fast energy-based voice activity detection on NumPy buffers.
+
+Only frame energies (and, for the recognizer gate, zero-crossing rates) are
+computed, one reshape and a reduction per call, so searching a minute of
+audio for a pause takes well under a millisecond.
+"""
+
+import bisect
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+FRAME_MS = 30
+MIN_PAUSE_MS = 300
+# A frame is silent when it is this close to the local noise floor
+PAUSE_MARGIN_DB = 8.0
+# Frame RMS (dB full scale) below which a frame counts as silence
+SILENCE_DB = -45.0
+# Quieter frames still count as speech when they cross zero this often
+# (unvoiced fricatives like /s/ and /f/ are weak but noisy)
+FRICATIVE_MARGIN_DB = 6.0
+FRICATIVE_ZCR = 0.3
+# How fast the gate's noise floor estimate may rise when the room gets louder
+FLOOR_RISE_DB_PER_SEC = 0.5
+
+
+def frame_energy_db(y: np.ndarray, sr: int, frame_ms: int = FRAME_MS) -> Tuple[np.ndarray, int]:
+    """RMS energy in dB of consecutive non-overlapping frames, and the frame length."""
+    frame = max(int(sr * frame_ms / 1000), 1)
+    count = len(y) // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32), frame
+    frames = np.asarray(y[:count * frame], dtype=np.float32).reshape(count, frame)
+    power = np.einsum("ij,ij->i", frames, frames) / frame
+    return 10 * np.log10(power + 1e-10), frame
+
+
+def zero_crossing_rate(y: np.ndarray, sr: int, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """Fraction of sign changes between consecutive samples, per frame."""
+    frame = max(int(sr * frame_ms / 1000), 1)
+    count = len(y) // frame
+    if count == 0 or frame < 2:
+        return np.zeros(count, dtype=np.float32)
+    signs = np.signbit(np.asarray(y[:count * frame]).reshape(count, frame))
+    return np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / np.float32(frame - 1)
+
+
+def is_silent(y: np.ndarray, sr: int, threshold_db: float = SILENCE_DB, frame_ms: int = FRAME_MS,
+              energy: Optional[np.ndarray] = None) -> bool:
+    """
+    True when no frame of ``y`` (float samples in [-1, 1]) looks like speech:
+    every frame is below ``threshold_db``, and the ones within
+    ``FRICATIVE_MARGIN_DB`` of it do not have a fricative-like zero-crossing rate.
+    ``energy`` are the frame energies of ``y`` when already computed.
+    """
+    if energy is None:
+        energy, _ = frame_energy_db(y, sr, frame_ms)
+    if len(energy) == 0 or (energy > threshold_db).any():
+        return False
+    near = energy > threshold_db - FRICATIVE_MARGIN_DB
+    if not near.any():
+        return True
+    return not (zero_crossing_rate(y, sr, frame_ms)[near] > FRICATIVE_ZCR).any()
+
+
+class SilenceGate:
+    """
+    Drops long silences from a stream of audio blocks before they reach the
+    recognizer, and maps times in the audio it let through back to times in
+    the original stream.
+
+    A block is silent when it stays below ``threshold_db`` or within
+    ``PAUSE_MARGIN_DB`` of the noise floor seen so far, whichever is higher,
+    so rooms with a loud floor are gated too. The first ``keep_sec`` of every
+    silence still pass, so the recognizer sees the pause (and closes the
+    utterance) as it would without the gate.
+    """
+
+    def __init__(self, sr: int, keep_sec: float, threshold_db: float = SILENCE_DB):
+        self.sr = sr
+        self.keep_frames = int(keep_sec * sr)
+        self.threshold_db = threshold_db
+        self.fed_frames = 0
+        self.skipped_frames = 0
+        self.floor_db: Optional[float] = None
+        self._silent_run = 0
+        # Fed-stream positions where audio was dropped, and frames dropped up to each
+        self._marks: List[int] = []
+        self._shifts: List[int] = []
+
+    def accept(self, y: np.ndarray) -> bool:
+        """Whether the block ``y`` should be fed to the recognizer."""
+        already_silent = self._silent_run
+        energy, _ = frame_energy_db(y, self.sr)
+        if len(energy):
+            quietest = float(energy.min())
+            rise = FLOOR_RISE_DB_PER_SEC * len(y) / self.sr
+            self.floor_db = quietest if self.floor_db is None else min(quietest, self.floor_db + rise)
+        threshold = self.threshold_db
+        if self.floor_db is not None:
+            threshold = max(threshold, self.floor_db + PAUSE_MARGIN_DB)
+        if is_silent(y, self.sr, threshold, energy=energy):
+            self._silent_run += len(y)
+        else:
+            self._silent_run = 0
+        if self._silent_run == 0 or already_silent < self.keep_frames:
+            self.fed_frames += len(y)
+            return True
+        self.skipped_frames += len(y)
+        if self._marks and self._marks[-1] == self.fed_frames:
+            self._shifts[-1] = self.skipped_frames
+        else:
+            self._marks.append(self.fed_frames)
+            self._shifts.append(self.skipped_frames)
+        return False
+
+    def original_time(self, sec: float) -> float:
+        """Time in the original stream of ``sec`` seconds into the fed audio."""
+        i = bisect.bisect_right(self._marks, sec * self.sr) - 1
+        return sec + self._shifts[i] / self.sr if i >= 0 else sec
+
+
+def find_pause(y: np.ndarray, sr: int, target: int, frame_ms: int = FRAME_MS,
+               min_pause_ms: int = MIN_PAUSE_MS, margin_db: float = PAUSE_MARGIN_DB) -> Optional[int]:
+    """
+    Sample index of the middle of the quietest pause in ``y`` closest to ``target``.
+
+    A pause is at least ``min_pause_ms`` long and stays within ``margin_db``
+    of the quietest part of ``y``. Returns None when ``y`` has no such pause.
+    """
+    energy, frame = frame_energy_db(y, sr, frame_ms)
+    width = max(min_pause_ms // frame_ms, 1)
+    if len(energy) < width:
+        return None
+
+    # Mean energy of every run of ``width`` frames
+    csum = np.concatenate([[0.0], np.cumsum(energy, dtype=np.float64)])
+    runs = (csum[width:] - csum[:-width]) / width
+    floor, typical = np.percentile(energy, [5, 50])
+    # Quiet relative to the noise floor and clearly below the surrounding speech
+    quiet = runs <= min(floor + margin_db, typical - margin_db)
+    if not quiet.any():
+        return None
+
+    # Prefer quieter runs, then runs closer to the target (up to 3 dB for the far edge)
+    centers = (np.arange(len(runs)) + width / 2) * frame
+    distance = np.abs(centers - target) / max(target, len(y) - target, 1)
+    score = np.where(quiet, runs + 3.0 * distance, np.inf)
+    return int(centers[int(np.argmin(score))])
+